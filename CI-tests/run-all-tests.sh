@@ -36,7 +36,7 @@ echo ""
 # Test Agent Core
 echo -e "${BLUE}Testing Agent Core...${NC}"
 cd "$PROJECT_ROOT/agent_core"
-if pytest tests/ -v --cov=. --cov-report=term --cov-report=html; then
+if pytest tests/ -v --runintegration --cov=. --cov-report=term --cov-report=html --cov-fail-under=60; then
     echo -e "${GREEN}✓ Agent Core tests passed${NC}"
 else
     echo -e "${RED}✗ Agent Core tests failed${NC}"
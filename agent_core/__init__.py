@@ -1,5 +1,6 @@
 """Agent core package exposing main entry points."""
 
+import importlib
 import sys
 import types
 
@@ -26,12 +27,26 @@ def _ensure_email_validator():
 
 _ensure_email_validator()
 
-from .agent import app as agent_app
-from .integrated_agent import IntegratedCoffeeAgent
-from .visualization_agent_v2 import CoffeeBrewVisualizationAgent
+# Entry points are resolved on first access so importing a light submodule
+# (e.g. ``agent_core.helpers``) does not pull in FastAPI and the OpenAI SDK.
+_LAZY_EXPORTS = {
+    "agent_app": (".agent", "app"),
+    "IntegratedCoffeeAgent": (".integrated_agent", "IntegratedCoffeeAgent"),
+    "CoffeeBrewVisualizationAgent": (".visualization_agent_v2", "CoffeeBrewVisualizationAgent"),
+}
 
 __all__ = [
     "agent_app",
     "IntegratedCoffeeAgent",
     "CoffeeBrewVisualizationAgent",
 ]
+
+
+def __getattr__(name):
+    try:
+        module_name, attr = _LAZY_EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module_name, __name__), attr)
+    globals()[name] = value
+    return value
@@ -19,6 +19,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from openai import OpenAI
 from pydantic import BaseModel, EmailStr, Field
 
+from .helpers import (  # noqa: F401 - re-exported for agent_core.agent callers
+    BEAN_COLUMNS,
+    _compute_evaluation_score,
+    _list_to_str,
+    bean_text_from_obj,
+    clean_json_payload,
+    flatten_dict,
+    load_bean_info,
+    normalize_recipe,
+    validate_recipe,
+)
 from .visualization_agent_v2 import CoffeeBrewVisualizationAgent
 
 try:
@@ -85,17 +96,6 @@ DEFAULT_RAG_PERSIST_DIR = REPO_ROOT / "dailydrip_rag" / "indexes" / "chroma"
 DEFAULT_RAG_SERVICE_URL = os.getenv("RAG_SERVICE_URL")
 RAG_COLLECTION = "coffee_chunks"
 RAG_MODEL = "all-MiniLM-L6-v2"
-BEAN_COLUMNS = [
-    "bean.name",
-    "bean.origin",
-    "bean.process",
-    "bean.variety",
-    "bean.region",
-    "bean.roast_level",
-    "bean.roasted_days",
-    "bean.altitude",
-    "bean.flavor_notes",
-]
 
 DATA_DIR = REPO_ROOT / "data"
 USER_STORE_PATH = DATA_DIR / "user_store.jsonl"
@@ -177,27 +177,31 @@ def _issue_token(user_id: str) -> str:
 
 
 def _format_bean_record(bean: Dict[str, Any]) -> Dict[str, Any]:
-    normalized = _normalize_roast_fields(dict(bean))
+    # Same result as formatting _normalize_roast_fields(dict(bean)), without copying the bean.
+    roasted_days = _compute_roasted_days(bean.get("roasted_on"))
+    if roasted_days is None:
+        roasted_days = bean.get("roasted_days")
     return {
-        "bean_id": normalized["bean_id"],
-        "name": normalized.get("name"),
-        "origin": normalized.get("origin"),
-        "process": normalized.get("process"),
-        "variety": normalized.get("variety"),
-        "roast_level": normalized.get("roast_level"),
-        "roasted_on": normalized.get("roasted_on"),
-        "roasted_days": normalized.get("roasted_days"),
-        "altitude": normalized.get("altitude"),
-        "flavor_notes": normalized.get("flavor_notes", []),
-        "created_at": normalized.get("created_at"),
-        "updated_at": normalized.get("updated_at"),
+        "bean_id": bean["bean_id"],
+        "name": bean.get("name"),
+        "origin": bean.get("origin"),
+        "process": bean.get("process"),
+        "variety": bean.get("variety"),
+        "roast_level": bean.get("roast_level"),
+        "roasted_on": bean.get("roasted_on"),
+        "roasted_days": roasted_days,
+        "altitude": bean.get("altitude"),
+        "flavor_notes": bean.get("flavor_notes", []),
+        "created_at": bean.get("created_at"),
+        "updated_at": bean.get("updated_at"),
     }
 
 
 def _clean_flavor_notes(notes: Optional[List[str]]) -> List[str]:
     if not notes:
         return []
-    return [note.strip() for note in notes if isinstance(note, str) and note.strip()]
+    # Strip each note once; the walrus keeps the filter and the value in one pass.
+    return [stripped for note in notes if isinstance(note, str) and (stripped := note.strip())]
 
 
 def _user_to_public_payload(user: Dict[str, Any]) -> Dict[str, Any]:
@@ -238,69 +242,6 @@ def get_authenticated_user(
     return _require_authenticated_user(token)
 
 
-def load_bean_info(bean_source: str) -> Dict[str, Any]:
-    """
-    Load bean information from a JSON string or a path to a JSON file.
-    """
-    path = Path(bean_source)
-    if path.exists():
-        raw = path.read_text(encoding="utf-8")
-    else:
-        raw = bean_source
-    return json.loads(raw)
-
-
-def clean_json_payload(payload: str) -> str:
-    """
-    Remove Markdown code fences, if present, before parsing the JSON payload.
-    """
-    payload = payload.strip()
-    if payload.startswith("```"):
-        payload = payload.strip("`")
-        if payload.lower().startswith("json"):
-            payload = payload[4:]
-    return payload.strip()
-
-
-def flatten_dict(data: Dict[str, Any], parent: str = "", sep: str = ".") -> Dict[str, Any]:
-    """
-    Flatten nested dictionaries using dotted key notation, matching ingest metadata.
-    """
-    flattened: Dict[str, Any] = {}
-    for key, value in data.items():
-        new_key = f"{parent}{sep}{key}" if parent else key
-        if isinstance(value, dict):
-            flattened.update(flatten_dict(value, new_key, sep=sep))
-        else:
-            flattened[new_key] = value
-    return flattened
-
-
-def _list_to_str(value: Any) -> Any:
-    return ", ".join(map(str, value)) if isinstance(value, list) else value
-
-
-def bean_text_from_obj(obj: Dict[str, Any]) -> str:
-    """
-    Construct the canonical bean text used for similarity search.
-    """
-    has_nested = any(isinstance(v, dict) for v in obj.values())
-    flat = flatten_dict(obj) if has_nested else obj
-    parts: List[str] = []
-    for key in BEAN_COLUMNS:
-        val = flat.get(key)
-        if val is None:
-            continue
-        if isinstance(val, list):
-            val = ", ".join(map(str, val))
-        
-        if val == "":
-            continue
-            
-        parts.append(f"{key}: {val}")
-    return " | ".join(parts)
-
-
 def reconstruct_pours(meta: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Rebuild pour steps from flattened metadata keys.
@@ -413,45 +354,6 @@ def _fetch_references_via_service(
         references.append(reference)
     return references
 
-def _compute_evaluation_score(evaluation: Optional[Dict[str, Any]]) -> float:
-    """Compute normalized evaluation score (0-1) from liking and JAG metrics."""
-    if not evaluation:
-        return 0.0
-    
-    score = 0.0
-    weights_sum = 0.0
-    
-    # Liking (0-10) → 60% weight
-    liking = evaluation.get("liking")
-    if liking is not None:
-        try:
-            normalized_liking = float(liking) / 10.0
-            score += normalized_liking * 0.6
-            weights_sum += 0.6
-        except (ValueError, TypeError):
-            pass
-    
-    # JAG metrics (1-5) → 40% weight
-    jag = evaluation.get("jag", {})
-    if isinstance(jag, dict):
-        jag_keys = ["flavour_intensity", "acidity", "mouthfeel", "sweetness", "purchase_intent"]
-        jag_values = []
-        for key in jag_keys:
-            val = jag.get(key)
-            if val is not None:
-                try:
-                    normalized_val = (float(val) - 1.0) / 4.0
-                    jag_values.append(normalized_val)
-                except (ValueError, TypeError):
-                    pass
-        
-        if jag_values:
-            jag_avg = sum(jag_values) / len(jag_values)
-            score += jag_avg * 0.4
-            weights_sum += 0.4
-    
-    return score / weights_sum if weights_sum > 0 else 0.0
-
 
 def _fetch_references_via_local_index(
     bean_info: Dict[str, Any],
@@ -682,49 +584,6 @@ def generate_recipe(
         raise RuntimeError(f"OpenAI API error: {e}")
 
 
-def normalize_recipe(recipe: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Accept recipes where the brewing block is either top-level or nested under ``brewing``.
-    """
-    if not isinstance(recipe, dict):
-        raise ValueError("Recipe must be a JSON object.")
-
-    brewing = recipe.get("brewing")
-    if isinstance(brewing, dict):
-        return recipe
-
-    expected = {"brewer", "temperature", "grinding_size", "dose", "target_water", "pours"}
-    if expected.issubset(recipe.keys()):
-        return {"brewing": recipe}
-
-    raise ValueError("Recipe payload missing brewing block.")
-
-
-def validate_recipe(recipe: Dict[str, Any]) -> None:
-    """
-    Perform basic validation to catch common model mistakes early.
-    Raises ValueError if the recipe fails a check.
-    """
-    brewing = recipe.get("brewing")
-    if not isinstance(brewing, dict):
-        raise ValueError("Missing brewing section.")
-
-    pours = brewing.get("pours")
-    if not isinstance(pours, list) or not pours:
-        raise ValueError("Pours must be a non-empty list.")
-
-    target = brewing.get("target_water")
-    total = sum(step.get("water_added", 0) for step in pours)
-    if target != total:
-        raise ValueError(
-            f"Sum of pours ({total}) does not match target_water ({target})."
-        )
-
-    brewer = brewing.get("brewer")
-    if not brewer:
-        raise ValueError("Brewer is required in brewing section.")
-
-
 class BrewRequest(BaseModel):
     bean: Dict[str, Any] = Field(..., description="Structured JSON description of the coffee bean.")
     brewer: str = Field(
@@ -915,7 +774,7 @@ def brew_with_options(
     bean = _normalize_roast_fields(dict(bean))
     flavors = bean.get("flavor_notes")
     if isinstance(flavors, str):
-        bean["flavor_notes"] = _clean_flavor_notes([note.strip() for note in flavors.split(",")])
+        bean["flavor_notes"] = _clean_flavor_notes(flavors.split(","))
     elif not isinstance(flavors, list):
         bean["flavor_notes"] = []
     else:
@@ -0,0 +1,194 @@
+"""
+Pure helper functions shared by the agent service.
+
+Kept free of FastAPI, OpenAI, and ChromaDB imports so callers (and tests) that
+only need parsing, flattening, or validation do not pay for the web stack.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore[assignment]
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+BEAN_COLUMNS = [
+    "bean.name",
+    "bean.origin",
+    "bean.process",
+    "bean.variety",
+    "bean.region",
+    "bean.roast_level",
+    "bean.roasted_days",
+    "bean.altitude",
+    "bean.flavor_notes",
+]
+
+# Keys that identify a bare brewing block; built once rather than per normalize call.
+BREWING_KEYS = frozenset({"brewer", "temperature", "grinding_size", "dose", "target_water", "pours"})
+
+
+def load_bean_info(bean_source: Union[str, Path, bytes]) -> Dict[str, Any]:
+    """
+    Load bean information from a JSON string/bytes or a path to a JSON file.
+
+    Files are read as raw bytes and handed straight to the decoder (orjson when
+    installed), skipping a separate UTF-8 decode step.
+    """
+    if isinstance(bean_source, bytes):
+        raw: Union[str, bytes] = bean_source
+    elif isinstance(bean_source, Path):
+        raw = bean_source.read_bytes()
+    else:
+        path = Path(bean_source)
+        raw = path.read_bytes() if path.exists() else bean_source
+    return _json_loads(raw)
+
+
+def clean_json_payload(payload: str) -> str:
+    """
+    Remove Markdown code fences, if present, before parsing the JSON payload.
+    """
+    payload = payload.strip()
+    if payload.startswith("```"):
+        payload = payload.strip("`")
+        # Lower-case only the tag, not a copy of the whole payload.
+        if payload[:4].lower() == "json":
+            payload = payload[4:]
+    return payload.strip()
+
+
+def flatten_dict(data: Dict[str, Any], parent: str = "", sep: str = ".") -> Dict[str, Any]:
+    """
+    Flatten nested dictionaries using dotted key notation, matching ingest metadata.
+
+    Walks an explicit stack of item iterators instead of recursing, so deep records
+    skip per-level call frames and intermediate dicts while keys keep their
+    depth-first insertion order.
+    """
+    flattened: Dict[str, Any] = {}
+    stack = [(parent, iter(data.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for key, value in items:
+            new_key = f"{prefix}{sep}{key}" if prefix else key
+            if isinstance(value, dict):
+                stack.append((new_key, iter(value.items())))
+                break
+            flattened[new_key] = value
+        else:
+            stack.pop()
+    return flattened
+
+
+def _list_to_str(value: Any) -> Any:
+    return ", ".join(map(str, value)) if isinstance(value, list) else value
+
+
+def bean_text_from_obj(obj: Dict[str, Any]) -> str:
+    """
+    Construct the canonical bean text used for similarity search.
+    """
+    has_nested = any(isinstance(v, dict) for v in obj.values())
+    flat = flatten_dict(obj) if has_nested else obj
+    parts: List[str] = []
+    for key in BEAN_COLUMNS:
+        val = flat.get(key)
+        if val is None:
+            continue
+        if isinstance(val, list):
+            val = ", ".join(map(str, val))
+
+        if val == "":
+            continue
+
+        parts.append(f"{key}: {val}")
+    return " | ".join(parts)
+
+
+def _compute_evaluation_score(evaluation: Optional[Dict[str, Any]]) -> float:
+    """Compute normalized evaluation score (0-1) from liking and JAG metrics."""
+    if not evaluation:
+        return 0.0
+
+    score = 0.0
+    weights_sum = 0.0
+
+    # Liking (0-10) → 60% weight
+    liking = evaluation.get("liking")
+    if liking is not None:
+        try:
+            normalized_liking = float(liking) / 10.0
+            score += normalized_liking * 0.6
+            weights_sum += 0.6
+        except (ValueError, TypeError):
+            pass
+
+    # JAG metrics (1-5) → 40% weight
+    jag = evaluation.get("jag", {})
+    if isinstance(jag, dict):
+        jag_keys = ["flavour_intensity", "acidity", "mouthfeel", "sweetness", "purchase_intent"]
+        jag_values = []
+        for key in jag_keys:
+            val = jag.get(key)
+            if val is not None:
+                try:
+                    normalized_val = (float(val) - 1.0) / 4.0
+                    jag_values.append(normalized_val)
+                except (ValueError, TypeError):
+                    pass
+
+        if jag_values:
+            jag_avg = sum(jag_values) / len(jag_values)
+            score += jag_avg * 0.4
+            weights_sum += 0.4
+
+    return score / weights_sum if weights_sum > 0 else 0.0
+
+
+def normalize_recipe(recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Accept recipes where the brewing block is either top-level or nested under ``brewing``.
+    """
+    if not isinstance(recipe, dict):
+        raise ValueError("Recipe must be a JSON object.")
+
+    brewing = recipe.get("brewing")
+    if isinstance(brewing, dict):
+        return recipe
+
+    if BREWING_KEYS.issubset(recipe.keys()):
+        return {"brewing": recipe}
+
+    raise ValueError("Recipe payload missing brewing block.")
+
+
+def validate_recipe(recipe: Dict[str, Any]) -> None:
+    """
+    Perform basic validation to catch common model mistakes early.
+    Raises ValueError if the recipe fails a check.
+    """
+    brewing = recipe.get("brewing")
+    if not isinstance(brewing, dict):
+        raise ValueError("Missing brewing section.")
+
+    pours = brewing.get("pours")
+    if not isinstance(pours, list) or not pours:
+        raise ValueError("Pours must be a non-empty list.")
+
+    target = brewing.get("target_water")
+    total = sum(step.get("water_added", 0) for step in pours)
+    if target != total:
+        raise ValueError(
+            f"Sum of pours ({total}) does not match target_water ({target})."
+        )
+
+    brewer = brewing.get("brewer")
+    if not brewer:
+        raise ValueError("Brewer is required in brewing section.")
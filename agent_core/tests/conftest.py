@@ -0,0 +1,83 @@
+"""Shared pytest fixtures for the agent_core test suite."""
+import os
+
+import pytest
+
+
+def pytest_configure(config):
+    """
+    Quiet optional heavy dependencies before any test module imports them.
+
+    The visualization agent is plain Python (no JIT or plotting backend to
+    disable), so the savings here come from ChromaDB and the tokenizer stack.
+    """
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--runintegration",
+        action="store_true",
+        default=False,
+        help="Also run tests marked 'integration' (skipped by default).",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runintegration"):
+        return
+    skip_integration = pytest.mark.skip(reason="integration test; pass --runintegration to run")
+    for item in items:
+        if "integration" in item.keywords:
+            item.add_marker(skip_integration)
+
+
+@pytest.fixture
+def clean_auth():
+    """
+    Empty the in-memory token, user, and email-index stores for one test, then restore them.
+
+    The dicts are cleared in place rather than swapped via monkeypatch, so every
+    reference to ``agent._active_tokens``/``agent._user_store``/``agent._email_index``
+    stays valid. Request handlers run in FastAPI's threadpool and must see the
+    same dicts, which is why this is not scoped with ``contextvars``.
+    """
+    from agent_core import agent
+
+    stores = (agent._active_tokens, agent._user_store, agent._email_index)
+    saved = [dict(store) for store in stores]
+    for store in stores:
+        store.clear()
+    yield agent
+    for store, snapshot in zip(stores, saved):
+        store.clear()
+        store.update(snapshot)
+
+
+def _build_recipe(brewer, temperature, dose, pours, grinding_size=22):
+    return {
+        "brewing": {
+            "brewer": brewer,
+            "temperature": temperature,
+            "grinding_size": grinding_size,
+            "dose": dose,
+            "target_water": sum(water for _, _, water in pours),
+            "pours": [
+                {"start": start, "end": end, "water_added": water}
+                for start, end, water in pours
+            ],
+        }
+    }
+
+
+@pytest.fixture(scope="session")
+def make_recipe():
+    """
+    Factory for ``{"brewing": ...}`` recipes built from ``(brewer, temperature, dose, pours)``.
+
+    ``pours`` is a tuple of ``(start, end, water_added)`` tuples and ``target_water``
+    is their sum. Every call returns a new dict (nested ``brewing`` and ``pours``
+    included), so code under test may normalize or mutate it freely.
+    """
+    return _build_recipe
@@ -1,5 +1,29 @@
 """Tests for the main agent module."""
 import os
+from pathlib import Path
+
+import pytest
+
+_PARENT = os.path.dirname(os.path.dirname(__file__))
+_AGENT = os.path.join(_PARENT, 'agent.py')
+_VIZ = os.path.join(_PARENT, 'visualization_agent_v2.py')
+_REQ = os.path.join(_PARENT, 'agent_requirements.txt')
+_INIT = os.path.join(_PARENT, '__init__.py')
+_VIZ_KEYWORDS = (b'plot', b'chart', b'graph', b'visual', b'matplotlib', b'plotly')
+
+
+@pytest.fixture(scope="module")
+def source_bytes():
+    """Read each file once; returns ``(raw, lowered)`` bytes so case-insensitive checks skip re-lowering."""
+    cache = {}
+
+    def read(path):
+        if path not in cache:
+            raw = Path(path).read_bytes()
+            cache[path] = (raw, raw.lower())
+        return cache[path]
+
+    return read
 
 
 class TestAgentModule:
@@ -7,22 +31,17 @@ class TestAgentModule:
     
     def test_agent_file_exists(self):
         """Test that agent.py exists."""
-        agent_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'agent.py')
-        assert os.path.exists(agent_path)
+        assert os.path.exists(_AGENT)
     
-    def test_agent_file_not_empty(self):
+    def test_agent_file_not_empty(self, source_bytes):
         """Test that agent.py is not empty."""
-        agent_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'agent.py')
-        with open(agent_path, 'r') as f:
-            content = f.read()
+        content, _ = source_bytes(_AGENT)
         assert len(content) > 0
     
-    def test_agent_has_fastapi_imports(self):
+    def test_agent_has_fastapi_imports(self, source_bytes):
         """Test that agent.py imports FastAPI."""
-        agent_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'agent.py')
-        with open(agent_path, 'r') as f:
-            content = f.read()
-        assert 'fastapi' in content.lower() or 'FastAPI' in content
+        _, lowered = source_bytes(_AGENT)
+        assert b'fastapi' in lowered
 
 
 class TestVisualizationAgent:
@@ -30,23 +49,18 @@ class TestVisualizationAgent:
     
     def test_visualization_agent_exists(self):
         """Test that visualization_agent_v2.py exists."""
-        viz_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'visualization_agent_v2.py')
-        assert os.path.exists(viz_path)
+        assert os.path.exists(_VIZ)
     
-    def test_visualization_agent_not_empty(self):
+    def test_visualization_agent_not_empty(self, source_bytes):
         """Test that visualization_agent_v2.py is not empty."""
-        viz_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'visualization_agent_v2.py')
-        with open(viz_path, 'r') as f:
-            content = f.read()
+        content, _ = source_bytes(_VIZ)
         assert len(content) > 0
     
-    def test_visualization_has_plotting_imports(self):
+    def test_visualization_has_plotting_imports(self, source_bytes):
         """Test that visualization agent has plotting capabilities."""
-        viz_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'visualization_agent_v2.py')
-        with open(viz_path, 'r') as f:
-            content = f.read()
+        _, lowered = source_bytes(_VIZ)
         # Check for common plotting/visualization keywords
-        has_viz = any(keyword in content.lower() for keyword in ['plot', 'chart', 'graph', 'visual', 'matplotlib', 'plotly'])
+        has_viz = any(keyword in lowered for keyword in _VIZ_KEYWORDS)
         assert has_viz
 
 
@@ -55,20 +69,16 @@ class TestAgentConfiguration:
     
     def test_requirements_file_exists(self):
         """Test that agent_requirements.txt exists."""
-        req_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'agent_requirements.txt')
-        assert os.path.exists(req_path)
+        assert os.path.exists(_REQ)
     
-    def test_requirements_has_dependencies(self):
+    def test_requirements_has_dependencies(self, source_bytes):
         """Test that requirements file has dependencies."""
-        req_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'agent_requirements.txt')
-        with open(req_path, 'r') as f:
-            content = f.read()
+        content, _ = source_bytes(_REQ)
         assert len(content.strip()) > 0
     
     def test_init_file_exists(self):
         """Test that __init__.py exists."""
-        init_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '__init__.py')
-        assert os.path.exists(init_path)
+        assert os.path.exists(_INIT)
 
 
 class TestAgentDataStructures:
@@ -1,12 +1,55 @@
 """Integration tests for agent API endpoints."""
 import json
-from unittest.mock import MagicMock, patch
+from types import MappingProxyType, SimpleNamespace
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 
 from agent_core.agent import app
 
+_PW = "testpass123"
+# Read-only base bean; tests merge per-test fields with ``{**_BEAN_BASE, ...}``.
+_BEAN_BASE = MappingProxyType({"name": "Test Bean", "origin": "Ethiopia", "process": "Washed"})
+
+# Serialized once at import; every mocked completion returns the same arguments.
+_MOCK_BREW_ARGS_JSON = json.dumps({
+    "brewing": {
+        "brewer": "V60",
+        "temperature": 92,
+        "grinding_size": 22,
+        "dose": 18,
+        "target_water": 288,
+        "pours": [{"start": 0, "end": 30, "water_added": 288}]
+    }
+})
+_PREBUILT_COMPLETION = SimpleNamespace(
+    choices=[SimpleNamespace(
+        message=SimpleNamespace(
+            function_call=SimpleNamespace(arguments=_MOCK_BREW_ARGS_JSON)
+        )
+    )]
+)
+
+
+def _create_completion(*args, **kwargs):
+    return _PREBUILT_COMPLETION
+
+
+@pytest.fixture(scope="module", autouse=True)
+def isolated_user_store(tmp_path_factory):
+    """
+    Point the user store at a temp dir so xdist workers never share the JSONL file.
+
+    Module-scoped so the patch is undone once this file's tests finish rather
+    than staying active for every module that runs after it.
+    """
+    data_dir = tmp_path_factory.mktemp("user_store")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("agent_core.agent.DATA_DIR", data_dir)
+        mp.setattr("agent_core.agent.USER_STORE_PATH", data_dir / "user_store.jsonl")
+        yield data_dir
+
 
 @pytest.fixture
 def client():
@@ -14,25 +57,28 @@ def client():
     return TestClient(app)
 
 
+@pytest.fixture(scope="session")
+def anyio_backend():
+    """Run async tests on a single asyncio loop for the whole session."""
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def async_client(anyio_backend):
+    """Session-wide ASGI client for single-request checks that skip TestClient's portal thread."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
 @pytest.fixture
 def mock_openai(monkeypatch):
     """Mock OpenAI client for recipe generation."""
-    mock_client = MagicMock()
-    mock_completion = MagicMock()
-    mock_completion.choices = [MagicMock()]
-    mock_completion.choices[0].message = MagicMock()
-    mock_completion.choices[0].message.function_call = MagicMock()
-    mock_completion.choices[0].message.function_call.arguments = json.dumps({
-        "brewing": {
-            "brewer": "V60",
-            "temperature": 92,
-            "grinding_size": 22,
-            "dose": 18,
-            "target_water": 288,
-            "pours": [{"start": 0, "end": 30, "water_added": 288}]
-        }
-    })
-    mock_client.chat.completions.create.return_value = mock_completion
+    mock_client = SimpleNamespace(
+        chat=SimpleNamespace(
+            completions=SimpleNamespace(create=_create_completion)
+        )
+    )
     
     def get_client():
         return mock_client
@@ -42,14 +88,15 @@ def mock_openai(monkeypatch):
 
 
 @pytest.mark.integration
+@pytest.mark.xdist_group(name="auth_endpoints")
 class TestAuthEndpoints:
     """Integration tests for authentication endpoints."""
     
-    def test_register_user_success(self, client):
-        """Test successful user registration."""
+    def test_auth_flow(self, client):
+        """Register, log back in, and read the profile with one account."""
         payload = {
             "email": "test@example.com",
-            "password": "testpass123",
+            "password": _PW,
             "display_name": "Test User"
         }
         response = client.post("/auth/register", json=payload)
@@ -58,12 +105,29 @@ class TestAuthEndpoints:
         assert "token" in data
         assert "user" in data
         assert data["user"]["email"] == "test@example.com"
+        
+        login_payload = {
+            "email": "test@example.com",
+            "password": _PW
+        }
+        response = client.post("/auth/login", json=login_payload)
+        assert response.status_code == 200
+        data = response.json()
+        assert "token" in data
+        assert "user" in data
+        token = data["token"]
+        
+        response = client.get("/profile", headers={"X-Auth-Token": token})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["email"] == "test@example.com"
+        assert data["display_name"] == "Test User"
     
     def test_register_duplicate_email(self, client):
         """Test registration with duplicate email fails."""
         payload = {
             "email": "duplicate@example.com",
-            "password": "testpass123"
+            "password": _PW
         }
         # First registration
         response1 = client.post("/auth/register", json=payload)
@@ -73,68 +137,34 @@ class TestAuthEndpoints:
         response2 = client.post("/auth/register", json=payload)
         assert response2.status_code == 409
     
-    def test_login_success(self, client):
-        """Test successful login."""
-        # Register first
-        register_payload = {
-            "email": "login@example.com",
-            "password": "testpass123"
-        }
-        client.post("/auth/register", json=register_payload)
-        
-        # Login
-        login_payload = {
-            "email": "login@example.com",
-            "password": "testpass123"
-        }
-        response = client.post("/auth/login", json=login_payload)
-        assert response.status_code == 200
-        data = response.json()
-        assert "token" in data
-        assert "user" in data
-    
-    def test_login_invalid_credentials(self, client):
+    @pytest.mark.anyio
+    async def test_login_invalid_credentials(self, async_client):
         """Test login with invalid credentials."""
         payload = {
             "email": "nonexistent@example.com",
             "password": "wrongpass"
         }
-        response = client.post("/auth/login", json=payload)
+        response = await async_client.post("/auth/login", json=payload)
         assert response.status_code == 401
 
 
 @pytest.mark.integration
+@pytest.mark.xdist_group(name="profile_endpoints")
 class TestProfileEndpoints:
     """Integration tests for profile endpoints."""
     
-    def test_get_profile_requires_auth(self, client):
+    @pytest.mark.anyio
+    async def test_get_profile_requires_auth(self, async_client):
         """Test that profile endpoint requires authentication."""
-        response = client.get("/profile")
+        response = await async_client.get("/profile")
         assert response.status_code == 401
     
-    def test_get_profile_success(self, client):
-        """Test getting user profile."""
-        # Register and get token
-        register_payload = {
-            "email": "profile@example.com",
-            "password": "testpass123"
-        }
-        register_response = client.post("/auth/register", json=register_payload)
-        token = register_response.json()["token"]
-        
-        # Get profile
-        response = client.get("/profile", headers={"X-Auth-Token": token})
-        assert response.status_code == 200
-        data = response.json()
-        assert "email" in data
-        assert data["email"] == "profile@example.com"
-    
     def test_update_preferences(self, client):
         """Test updating user preferences."""
         # Register and get token
         register_payload = {
             "email": "prefs@example.com",
-            "password": "testpass123"
+            "password": _PW
         }
         register_response = client.post("/auth/register", json=register_payload)
         token = register_response.json()["token"]
@@ -151,6 +181,7 @@ class TestProfileEndpoints:
 
 
 @pytest.mark.integration
+@pytest.mark.xdist_group(name="bean_endpoints")
 class TestBeanEndpoints:
     """Integration tests for bean management endpoints."""
     
@@ -159,7 +190,7 @@ class TestBeanEndpoints:
         # Register and get token
         register_payload = {
             "email": "beans@example.com",
-            "password": "testpass123"
+            "password": _PW
         }
         register_response = client.post("/auth/register", json=register_payload)
         token = register_response.json()["token"]
@@ -176,7 +207,7 @@ class TestBeanEndpoints:
         # Register and get token
         register_payload = {
             "email": "createbean@example.com",
-            "password": "testpass123"
+            "password": _PW
         }
         register_response = client.post("/auth/register", json=register_payload)
         token = register_response.json()["token"]
@@ -184,9 +215,7 @@ class TestBeanEndpoints:
         # Create bean - BeanPayload requires name (roast_level is int, not string)
         bean_payload = {
             "bean": {
-                "name": "Test Bean",
-                "origin": "Ethiopia",
-                "process": "Washed",
+                **_BEAN_BASE,
                 "roast_level": 2,  # Integer, not string
                 "flavor_notes": ["fruity", "citrus"]
             }
@@ -204,7 +233,7 @@ class TestBeanEndpoints:
         # Register and get token
         register_payload = {
             "email": "updatebean@example.com",
-            "password": "testpass123"
+            "password": _PW
         }
         register_response = client.post("/auth/register", json=register_payload)
         token = register_response.json()["token"]
@@ -236,7 +265,7 @@ class TestBeanEndpoints:
         # Register and get token
         register_payload = {
             "email": "deletebean@example.com",
-            "password": "testpass123"
+            "password": _PW
         }
         register_response = client.post("/auth/register", json=register_payload)
         token = register_response.json()["token"]
@@ -261,6 +290,7 @@ class TestBeanEndpoints:
 
 
 @pytest.mark.integration
+@pytest.mark.xdist_group(name="brew_endpoints")
 class TestBrewEndpoints:
     """Integration tests for brewing endpoints."""
     
@@ -269,18 +299,14 @@ class TestBrewEndpoints:
         # Register and get token
         register_payload = {
             "email": "brew@example.com",
-            "password": "testpass123"
+            "password": _PW
         }
         register_response = client.post("/auth/register", json=register_payload)
         token = register_response.json()["token"]
         
         # Brew recipe with bean dict (disable RAG to avoid external service calls)
         brew_payload = {
-            "bean": {
-                "name": "Brew Bean",
-                "origin": "Ethiopia",
-                "process": "Washed"
-            },
+            "bean": {**_BEAN_BASE, "name": "Brew Bean"},
             "brewer": "V60",
             "rag_enabled": False
         }
@@ -296,7 +322,7 @@ class TestBrewEndpoints:
         # Register and get token
         register_payload = {
             "email": "brewnote@example.com",
-            "password": "testpass123"
+            "password": _PW
         }
         register_response = client.post("/auth/register", json=register_payload)
         token = register_response.json()["token"]
@@ -316,28 +342,18 @@ class TestBrewEndpoints:
 
 
 @pytest.mark.integration
+@pytest.mark.xdist_group(name="visualization_endpoints")
 class TestVisualizationEndpoints:
     """Integration tests for visualization endpoints."""
     
-    def test_visualize_recipe(self, client):
+    def test_visualize_recipe(self, client, make_recipe):
         """Test recipe visualization."""
         recipe = {
             "bean": {
                 "name": "Test Bean",
                 "flavor_notes": ["fruity", "citrus"]
             },
-            "brewing": {
-                "brewer": "V60",
-                "temperature": 92,
-                "grinding_size": 22,
-                "dose": 18,
-                "target_water": 288,
-                "pours": [
-                    {"start": 0, "end": 30, "water_added": 100},
-                    {"start": 30, "end": 60, "water_added": 100},
-                    {"start": 60, "end": 90, "water_added": 88}
-                ]
-            }
+            **make_recipe("V60", 92, 18, ((0, 30, 100), (30, 60, 100), (60, 90, 88))),
         }
         
         payload = {
@@ -1,11 +1,25 @@
 """Unit tests for agent helper functions."""
 import json
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 import pytest
 
-from agent_core import agent
+from agent_core import helpers
+
+
+class _StubResponse:
+    """Minimal stand-in for ``httpx.Response`` exposing only what the agent reads."""
+
+    __slots__ = ("status_code", "_json", "text")
+
+    def __init__(self, status_code, payload, text):
+        self.status_code = status_code
+        self._json = payload
+        self.text = text
+
+    def json(self):
+        return self._json
 
 
 @pytest.mark.unit
@@ -15,7 +29,7 @@ class TestHelperFunctions:
     def test_load_bean_info_from_string(self):
         """Test loading bean info from JSON string."""
         bean_json = '{"name": "Test Bean", "origin": "Ethiopia"}'
-        result = agent.load_bean_info(bean_json)
+        result = helpers.load_bean_info(bean_json)
         assert result["name"] == "Test Bean"
         assert result["origin"] == "Ethiopia"
     
@@ -25,34 +39,43 @@ class TestHelperFunctions:
         bean_data = {"name": "File Bean", "origin": "Colombia"}
         bean_file.write_text(json.dumps(bean_data))
         
-        result = agent.load_bean_info(str(bean_file))
+        result = helpers.load_bean_info(bean_file)
         assert result["name"] == "File Bean"
         assert result["origin"] == "Colombia"
     
-    def test_clean_json_payload_with_markdown(self):
-        """Test cleaning JSON payload with markdown fences."""
-        payload = "```json\n{\"name\": \"Test\"}\n```"
-        cleaned = agent.clean_json_payload(payload)
-        assert cleaned == '{"name": "Test"}'
-    
-    def test_clean_json_payload_without_markdown(self):
-        """Test cleaning JSON payload without markdown."""
-        payload = '{"name": "Test"}'
-        cleaned = agent.clean_json_payload(payload)
-        assert cleaned == '{"name": "Test"}'
+    @pytest.mark.parametrize(
+        "payload",
+        [
+            "```json\n{\"name\": \"Test\"}\n```",
+            "```JSON\n{\"name\": \"Test\"}\n```",
+            "```\n{\"name\": \"Test\"}\n```",
+            '  {"name": "Test"}\n',
+            '{"name": "Test"}',
+        ],
+        ids=["fenced-json", "fenced-upper", "fenced-bare", "padded-raw", "raw"],
+    )
+    def test_clean_json_payload(self, payload):
+        """Test cleaning JSON payloads with and without markdown fences."""
+        assert helpers.clean_json_payload(payload) == '{"name": "Test"}'
     
     def test_flatten_dict_simple(self):
         """Test flattening simple dictionary."""
         data = {"a": 1, "b": 2}
-        result = agent.flatten_dict(data)
+        result = helpers.flatten_dict(data)
         assert result == {"a": 1, "b": 2}
     
     def test_flatten_dict_nested(self):
         """Test flattening nested dictionary."""
         data = {"a": 1, "b": {"c": 2, "d": 3}}
-        result = agent.flatten_dict(data)
+        result = helpers.flatten_dict(data)
         assert result == {"a": 1, "b.c": 2, "b.d": 3}
     
+    def test_flatten_dict_preserves_depth_first_order(self):
+        """Test that nested keys stay in place relative to their siblings."""
+        data = {"a": {"b": {"c": 1}, "d": 2}, "e": {}, "f": 3}
+        result = helpers.flatten_dict(data, sep="/")
+        assert list(result.items()) == [("a/b/c", 1), ("a/d", 2), ("f", 3)]
+    
     def test_bean_text_from_obj_simple(self):
         """Test generating bean text from simple object."""
         obj = {
@@ -62,7 +85,7 @@ class TestHelperFunctions:
                 "process": "Washed"
             }
         }
-        text = agent.bean_text_from_obj(obj)
+        text = helpers.bean_text_from_obj(obj)
         # Should contain at least one of the bean fields
         assert len(text) > 0
         assert "Test Bean" in text or "Ethiopia" in text or "Washed" in text
@@ -75,7 +98,7 @@ class TestHelperFunctions:
                 "origin": "Colombia"
             }
         }
-        text = agent.bean_text_from_obj(obj)
+        text = helpers.bean_text_from_obj(obj)
         assert "Nested Bean" in text
         assert "Colombia" in text
     
@@ -89,7 +112,7 @@ class TestHelperFunctions:
             "target_water": 288,
             "pours": []
         }
-        result = agent.normalize_recipe(recipe)
+        result = helpers.normalize_recipe(recipe)
         assert "brewing" in result
         assert result["brewing"]["brewer"] == "V60"
     
@@ -101,7 +124,7 @@ class TestHelperFunctions:
                 "temperature": 93
             }
         }
-        result = agent.normalize_recipe(recipe)
+        result = helpers.normalize_recipe(recipe)
         assert result["brewing"]["brewer"] == "April"
     
     def test_validate_recipe_valid(self):
@@ -117,7 +140,7 @@ class TestHelperFunctions:
             }
         }
         # Should not raise
-        agent.validate_recipe(recipe)
+        helpers.validate_recipe(recipe)
     
     def test_validate_recipe_invalid_brewer(self):
         """Test validating recipe with invalid brewer."""
@@ -131,12 +154,12 @@ class TestHelperFunctions:
             }
         }
         with pytest.raises(ValueError):
-            agent.validate_recipe(recipe)
+            helpers.validate_recipe(recipe)
     
     def test_compute_evaluation_score_with_liking(self):
         """Test computing evaluation score with liking."""
         evaluation = {"liking": 8}
-        score = agent._compute_evaluation_score(evaluation)
+        score = helpers._compute_evaluation_score(evaluation)
         assert 0.0 < score <= 1.0
     
     def test_compute_evaluation_score_with_jag(self):
@@ -148,7 +171,7 @@ class TestHelperFunctions:
                 "sweetness": 8
             }
         }
-        score = agent._compute_evaluation_score(evaluation)
+        score = helpers._compute_evaluation_score(evaluation)
         # Score should be normalized (0-1 range)
         assert score >= 0.0
         # JAG scores are averaged and normalized, so should be reasonable
@@ -156,7 +179,7 @@ class TestHelperFunctions:
     
     def test_compute_evaluation_score_empty(self):
         """Test computing evaluation score with empty evaluation."""
-        score = agent._compute_evaluation_score(None)
+        score = helpers._compute_evaluation_score(None)
         assert score == 0.0
     
     def test_fetch_references_with_service_url(self, monkeypatch):
@@ -175,11 +198,9 @@ class TestHelperFunctions:
         }
         
         def mock_post(*args, **kwargs):
-            mock_resp = MagicMock()
-            mock_resp.status_code = 200
-            mock_resp.json.return_value = mock_response
-            mock_resp.text = ""
-            return mock_resp
+            return _StubResponse(200, mock_response, "")
+        
+        from agent_core import agent
         
         with patch("agent_core.agent.httpx") as mock_httpx:
             mock_httpx.Client.return_value.__enter__.return_value.post = mock_post
@@ -197,6 +218,7 @@ class TestHelperFunctions:
     
     def test_fetch_references_no_httpx(self):
         """Test that fetch_references raises error when httpx not available."""
+        from agent_core import agent
         with patch("agent_core.agent.httpx", None):
             with pytest.raises(RuntimeError, match="httpx is not installed"):
                 agent._fetch_references_via_service(
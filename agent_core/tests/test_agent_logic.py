@@ -1,27 +1,64 @@
 """Behavioral tests exercising the agent_core logic helpers."""
-from types import SimpleNamespace
+from types import MappingProxyType, SimpleNamespace
 
 import json
 import pytest
 from fastapi import HTTPException
 
 from agent_core import agent
+from agent_core.visualization_agent_v2 import CoffeeBrewVisualizationAgent
 
 
-def test_compute_and_normalize_roast_days(monkeypatch):
-    class FixedDatetime(agent.datetime):  # type: ignore[attr-defined]
-        @classmethod
-        def utcnow(cls):
-            return cls(2024, 6, 20, 0, 0, 0)
+class _FixedDatetime(agent.datetime):  # type: ignore[attr-defined]
+    @classmethod
+    def utcnow(cls):
+        return cls(2024, 6, 20, 0, 0, 0)
+
+
+_RECIPE_PAYLOAD = {
+    "brewing": {
+        "brewer": "V60",
+        "temperature": 92,
+        "grinding_size": 22,
+        "dose": 18,
+        "target_water": 288,
+        "pours": [{"start": 0, "end": 30, "water_added": 288}],
+    }
+}
+# Built once; the fake OpenAI client hands back this same completion on every call.
+_RECIPE_COMPLETION = SimpleNamespace(
+    choices=[SimpleNamespace(
+        message=SimpleNamespace(function_call=SimpleNamespace(arguments=json.dumps(_RECIPE_PAYLOAD)))
+    )]
+)
+
+
+# Read-only view: the metadata helpers only index into it, so any write is a bug.
+_FLAT_META = MappingProxyType({
+    "brewing.brewer": "V60",
+    "brewing.temperature": 94,
+    "brewing.pours.0.start": 0,
+    "brewing.pours.0.end": 30,
+    "brewing.pours.0.water_added": 60,
+    "brewing.pours.1.start": 30,
+    "brewing.pours.1.end": 60,
+    "brewing.pours.1.water_added": 140,
+    "evaluation.liking": 8,
+    "evaluation.jag.flavour_intensity": 4,
+})
 
-    monkeypatch.setattr(agent, "datetime", FixedDatetime)
+
+def test_compute_and_normalize_roast_days(monkeypatch):
+    monkeypatch.setattr(agent, "datetime", _FixedDatetime)
 
     assert agent._compute_roasted_days("2024-06-18") == 2
     assert agent._compute_roasted_days("bad-date") is None
 
     bean = {"bean_id": "b1", "roasted_on": "2024-06-18", "roasted_days": None}
-    normalized = agent._normalize_roast_fields(bean.copy())
+    normalized = agent._normalize_roast_fields(bean)
+    assert normalized is bean
     assert normalized["roasted_days"] == 2
+    assert agent._format_bean_record(bean)["roasted_days"] == 2
 
 
 def test_clean_payload_and_flatten_dict():
@@ -38,34 +75,22 @@ def test_clean_payload_and_flatten_dict():
 
 
 def test_reconstruct_extract_and_evaluation_helpers():
-    meta = {
-        "brewing.brewer": "V60",
-        "brewing.temperature": 94,
-        "brewing.pours.0.start": 0,
-        "brewing.pours.0.end": 30,
-        "brewing.pours.0.water_added": 60,
-        "brewing.pours.1.start": 30,
-        "brewing.pours.1.end": 60,
-        "brewing.pours.1.water_added": 140,
-        "evaluation.liking": 8,
-        "evaluation.jag.flavour_intensity": 4,
-    }
-
-    pours = agent.reconstruct_pours(meta)
+    pours = agent.reconstruct_pours(_FLAT_META)
     assert len(pours) == 2
-    brewing = agent.extract_brewing(meta)
+    brewing = agent.extract_brewing(_FLAT_META)
     assert brewing["brewer"] == "V60"
     assert brewing["pours"][0]["water_added"] == 60
 
-    evaluation = agent.extract_evaluation(meta)
+    evaluation = agent.extract_evaluation(_FLAT_META)
     assert evaluation["liking"] == 8
     assert evaluation["jag"]["flavour_intensity"] == 4
     assert 0 < agent._compute_evaluation_score(evaluation) < 1
 
 
 def test_clean_flavor_notes_and_format_record():
-    notes = [" citrus ", None, ""]  # type: ignore[list-item]
-    assert agent._clean_flavor_notes(notes) == ["citrus"]
+    notes = [" citrus ", None, "", "   ", 3, "berry"]  # type: ignore[list-item]
+    assert agent._clean_flavor_notes(notes) == ["citrus", "berry"]
+    assert agent._clean_flavor_notes(None) == []
 
     bean = {
         "bean_id": "b42",
@@ -80,41 +105,46 @@ def test_clean_flavor_notes_and_format_record():
 
 def test_load_bean_info_from_path(tmp_path):
     payload = {"bean": {"name": "Panama"}}
+    serialized = json.dumps(payload)
     bean_file = tmp_path / "bean.json"
-    bean_file.write_text(json.dumps(payload), encoding="utf-8")
+    bean_file.write_text(serialized, encoding="utf-8")
 
     assert agent.load_bean_info(str(bean_file)) == payload
-    assert agent.load_bean_info(json.dumps(payload)) == payload
+    assert agent.load_bean_info(serialized) == payload
+
+
+@pytest.mark.parametrize(
+    "serialize",
+    [
+        lambda recipes: "\n".join(json.dumps(r) for r in recipes),
+        lambda recipes: "\n".join(json.dumps(r, indent=2) for r in recipes),
+        json.dumps,
+        lambda recipes: json.dumps(recipes, indent=2),
+    ],
+    ids=["jsonl", "pretty-printed", "array", "pretty-printed-array"],
+)
+def test_visualization_loads_recipe_by_index(tmp_path, serialize):
+    recipes = [
+        {**_RECIPE_PAYLOAD, "bean": {"name": f"Bean {i}", "notes": "braces } in { strings"}}
+        for i in range(3)
+    ]
+    log_file = tmp_path / "logs.jsonl"
+    log_file.write_text(serialize(recipes), encoding="utf-8")
+
+    viz = CoffeeBrewVisualizationAgent()
+    viz.load_recipe_from_file(str(log_file), recipe_index=2)
+    assert viz.recipe_data["bean"]["name"] == "Bean 2"
+    assert len(viz.brewing_steps) == 1
+
+    with pytest.raises(ValueError, match="found 3 recipes"):
+        viz.load_recipe_from_file(str(log_file), recipe_index=3)
 
 
 def test_generate_recipe_uses_mocked_openai(monkeypatch):
-    recipe_payload = {
-        "brewing": {
-            "brewer": "V60",
-            "temperature": 92,
-            "grinding_size": 22,
-            "dose": 18,
-            "target_water": 288,
-            "pours": [{"start": 0, "end": 30, "water_added": 288}],
-        }
-    }
-    func_args_json = json.dumps(recipe_payload)
-
-    class DummyClient:
-        def __init__(self):
-            self.chat = SimpleNamespace(
-                completions=SimpleNamespace(
-                    create=lambda **kwargs: SimpleNamespace(
-                        choices=[SimpleNamespace(
-                            message=SimpleNamespace(
-                                function_call=SimpleNamespace(arguments=func_args_json)
-                            )
-                        )]
-                    )
-                )
-            )
-
-    monkeypatch.setattr(agent, "_get_openai_client", lambda: DummyClient())
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: _RECIPE_COMPLETION))
+    )
+    monkeypatch.setattr(agent, "_get_openai_client", lambda: client)
 
     result = agent.generate_recipe({"name": "Test Bean"}, "V60", reference_recipes=[{"rank": 1}])
     assert result["brewing"]["brewer"] == "V60"
@@ -144,14 +174,15 @@ def test_normalize_and_validate_recipe():
             "pours": [{"start": 0, "end": 30, "water_added": 150}],
         }
     }
-    with pytest.raises(ValueError):
+    with pytest.raises(ValueError, match="does not match target_water"):
         agent.validate_recipe(invalid)
 
 
-def test_authentication_helpers(monkeypatch):
+def test_authentication_helpers(clean_auth):
     dummy_user = {"user_id": "user-1", "email": "owner@example.com", "beans": []}
-    monkeypatch.setattr(agent, "_active_tokens", {"token-abc": "user-1"})
-    monkeypatch.setattr(agent, "_user_store", {"user-1": dummy_user})
+    clean_auth._active_tokens["token-abc"] = "user-1"
+    clean_auth._user_store["user-1"] = dummy_user
+    clean_auth._email_index["owner@example.com"] = "user-1"
 
     assert agent._require_authenticated_user("token-abc") == dummy_user
     with pytest.raises(HTTPException):
@@ -161,29 +192,50 @@ def test_authentication_helpers(monkeypatch):
     assert result == dummy_user
 
 
-def test_query_reference_routing(monkeypatch, tmp_path):
-    service_calls = []
-    local_calls = []
+@pytest.fixture(scope="module")
+def rag_persist_dir(tmp_path_factory):
+    """Placeholder persist dir; the patched backends never read or write it."""
+    return tmp_path_factory.mktemp("rag")
+
+
+@pytest.fixture
+def routing_fakes(monkeypatch):
+    """Patch both retrieval backends and record which one each query reaches."""
+    calls = {"service": [], "local": []}
 
     def fake_service(*args, **kwargs):
-        service_calls.append((args, kwargs))
+        calls["service"].append((args, kwargs))
         return [{"id": "service"}]
 
     def fake_local(*args, **kwargs):
-        local_calls.append((args, kwargs))
+        calls["local"].append((args, kwargs))
         return [{"id": "local"}]
 
     monkeypatch.setattr(agent, "_fetch_references_via_service", fake_service)
     monkeypatch.setattr(agent, "_fetch_references_via_local_index", fake_local)
-
+    return calls
+
+
+@pytest.mark.parametrize(
+    "rag_service_url, k, expected_source",
+    [
+        ("https://example.com", 2, "service"),
+        (None, 1, "local"),
+        (None, 0, None),
+    ],
+)
+def test_query_reference_routing(routing_fakes, rag_persist_dir, rag_service_url, k, expected_source):
     bean = {"bean": {"name": "Test"}}
-    assert agent.query_reference_recipes(bean, rag_service_url="https://example.com", k=2, user_id="test-user")[0]["id"] == "service"
-    assert service_calls
-
-    assert agent.query_reference_recipes(bean, rag_service_url=None, persist_dir=tmp_path, k=1)[0]["id"] == "local"
-    assert local_calls
-
-    assert agent.query_reference_recipes(bean, rag_service_url=None, persist_dir=tmp_path, k=0) == []
+    result = agent.query_reference_recipes(
+        bean, rag_service_url=rag_service_url, persist_dir=rag_persist_dir, k=k, user_id="test-user"
+    )
+
+    if expected_source is None:
+        assert result == []
+        assert not routing_fakes["service"] and not routing_fakes["local"]
+    else:
+        assert result[0]["id"] == expected_source
+        assert len(routing_fakes[expected_source]) == 1
 
 
 def test_user_payload_conversion(monkeypatch):
@@ -1,24 +1,22 @@
 """Integration tests for the integrated agent."""
 import os
 
+import pytest
 
+BASE = os.path.dirname(os.path.dirname(__file__))
+
+
+@pytest.mark.unit
 class TestIntegratedAgent:
     """Test the integrated agent functionality."""
     
-    def test_integrated_agent_file_exists(self):
-        """Test that the integrated agent file exists."""
-        agent_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'integrated_agent.py')
-        assert os.path.exists(agent_path)
-    
-    def test_agent_file_exists(self):
-        """Test that the main agent file exists."""
-        agent_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'agent.py')
-        assert os.path.exists(agent_path)
-    
-    def test_visualization_agent_file_exists(self):
-        """Test that the visualization agent file exists."""
-        viz_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'visualization_agent_v2.py')
-        assert os.path.exists(viz_path)
+    @pytest.mark.parametrize(
+        "filename",
+        ["integrated_agent.py", "agent.py", "visualization_agent_v2.py"],
+    )
+    def test_file_exists(self, filename):
+        """Test that each agent module file exists."""
+        assert os.path.exists(os.path.join(BASE, filename))
 
 
 class TestAgentHelpers:
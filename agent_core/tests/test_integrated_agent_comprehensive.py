@@ -1,5 +1,5 @@
 """Comprehensive integration tests for IntegratedCoffeeAgent."""
-from unittest.mock import MagicMock, patch
+from unittest.mock import Mock, patch
 
 import pytest
 
@@ -7,6 +7,48 @@ from agent_core.integrated_agent import IntegratedCoffeeAgent
 from agent_core.agent import fetch_references, generate_recipe
 
 
+@pytest.fixture(scope="module")
+def integrated_agent():
+    """One agent (and visualization agent) shared by every test in the module."""
+    return IntegratedCoffeeAgent(rag_enabled=True, rag_k=3)
+
+
+@pytest.fixture(scope="module")
+def bean_info():
+    """Bean details passed to ``generate_complete_recipe``; never mutated by the agent."""
+    return {"name": "Test Bean", "origin": "Ethiopia"}
+
+
+@pytest.fixture(scope="module")
+def mock_recipe(make_recipe):
+    """Single-pour V60 recipe returned by the patched ``generate_recipe``."""
+    return make_recipe("V60", 92, 18, ((0, 30, 288),))
+
+
+@pytest.fixture
+def sample_recipe(make_recipe):
+    """Three-pour V60 recipe used by the visualization tests."""
+    return {
+        "bean": {
+            "name": "Test Bean",
+            "flavor_notes": ["fruity", "citrus"]
+        },
+        **make_recipe("V60", 92, 18, ((0, 30, 100), (30, 60, 100), (60, 90, 88))),
+    }
+
+
+@pytest.fixture
+def mocks():
+    """Patch the agent's RAG and recipe-generation calls; yields ``(fetch, generate)``.
+
+    Both are called as plain functions, so a ``Mock`` suffices and skips the
+    magic-method setup ``MagicMock`` performs.
+    """
+    with patch('agent_core.integrated_agent.fetch_references', new_callable=Mock) as fetch, \
+         patch('agent_core.integrated_agent.generate_recipe', new_callable=Mock) as generate:
+        yield fetch, generate
+
+
 @pytest.mark.integration
 class TestIntegratedAgent:
     """Integration tests for IntegratedCoffeeAgent."""
@@ -27,28 +69,15 @@ class TestIntegratedAgent:
         assert agent.rag_enabled is False
         assert agent.rag_k == 5
     
-    @patch('agent_core.integrated_agent.fetch_references')
-    @patch('agent_core.integrated_agent.generate_recipe')
-    def test_generate_complete_recipe_with_rag(self, mock_generate, mock_fetch):
+    def test_generate_complete_recipe_with_rag(self, integrated_agent, mocks, bean_info, mock_recipe):
         """Test generating complete recipe with RAG enabled."""
-        # Setup mocks
+        mock_fetch, mock_generate = mocks
         mock_fetch.return_value = [
             {"rank": 1, "bean_text": "Reference Bean", "brewing": {"brewer": "V60"}}
         ]
-        mock_generate.return_value = {
-            "brewing": {
-                "brewer": "V60",
-                "temperature": 92,
-                "dose": 18,
-                "target_water": 288,
-                "pours": [{"start": 0, "end": 30, "water_added": 288}]
-            }
-        }
+        mock_generate.return_value = mock_recipe
         
-        agent = IntegratedCoffeeAgent(rag_enabled=True)
-        bean_info = {"name": "Test Bean", "origin": "Ethiopia"}
-        
-        result = agent.generate_complete_recipe(bean_info, "V60")
+        result = integrated_agent.generate_complete_recipe(bean_info, "V60")
         
         assert "bean" in result
         assert "brewing" in result
@@ -56,97 +85,39 @@ class TestIntegratedAgent:
         mock_fetch.assert_called_once()
         mock_generate.assert_called_once()
     
-    @patch('agent_core.integrated_agent.fetch_references')
-    @patch('agent_core.integrated_agent.generate_recipe')
-    def test_generate_complete_recipe_without_rag(self, mock_generate, mock_fetch):
+    def test_generate_complete_recipe_without_rag(
+        self, integrated_agent, mocks, bean_info, mock_recipe, monkeypatch
+    ):
         """Test generating complete recipe with RAG disabled."""
-        mock_generate.return_value = {
-            "brewing": {
-                "brewer": "April",
-                "temperature": 93,
-                "dose": 16,
-                "target_water": 240,
-                "pours": [{"start": 0, "end": 40, "water_added": 240}]
-            }
-        }
-        
-        agent = IntegratedCoffeeAgent(rag_enabled=False)
-        bean_info = {"name": "No RAG Bean", "origin": "Colombia"}
+        mock_fetch, mock_generate = mocks
+        mock_generate.return_value = mock_recipe
+        monkeypatch.setattr(integrated_agent, "rag_enabled", False)
         
-        result = agent.generate_complete_recipe(bean_info, "April")
+        result = integrated_agent.generate_complete_recipe(bean_info, "V60")
         
         assert "brewing" in result
         mock_fetch.assert_not_called()
         mock_generate.assert_called_once()
     
-    @patch('agent_core.integrated_agent.fetch_references')
-    @patch('agent_core.integrated_agent.generate_recipe')
-    def test_generate_complete_recipe_rag_failure_handling(self, mock_generate, mock_fetch):
+    def test_generate_complete_recipe_rag_failure_handling(
+        self, integrated_agent, mocks, bean_info, mock_recipe
+    ):
         """Test that RAG failures are handled gracefully."""
+        mock_fetch, mock_generate = mocks
         mock_fetch.side_effect = Exception("RAG service unavailable")
-        mock_generate.return_value = {
-            "brewing": {
-                "brewer": "V60",
-                "temperature": 92,
-                "grinding_size": 22,
-                "dose": 18,
-                "target_water": 288,
-                "pours": [{"start": 0, "end": 30, "water_added": 288}]
-            }
-        }
-        
-        agent = IntegratedCoffeeAgent(rag_enabled=True)
-        bean_info = {"name": "Test Bean"}
+        mock_generate.return_value = mock_recipe
         
         # Should not raise, should continue without references
-        result = agent.generate_complete_recipe(bean_info, "V60")
+        result = integrated_agent.generate_complete_recipe(bean_info, "V60")
         assert "brewing" in result
     
-    def test_visualize_recipe(self):
-        """Test recipe visualization."""
-        agent = IntegratedCoffeeAgent()
-        recipe = {
-            "bean": {
-                "name": "Test Bean",
-                "flavor_notes": ["fruity", "citrus"]
-            },
-            "brewing": {
-                "brewer": "V60",
-                "temperature": 92,
-                "grinding_size": 22,
-                "dose": 18,
-                "target_water": 288,
-                "pours": [
-                    {"start": 0, "end": 30, "water_added": 100},
-                    {"start": 30, "end": 60, "water_added": 100},
-                    {"start": 60, "end": 90, "water_added": 88}
-                ]
-            }
-        }
-        
-        result = agent.visualize_recipe(recipe, output_formats=["html", "ascii"])
-        assert isinstance(result, dict)
-        # Visualization agent should return some format
-        assert len(result) > 0
-    
-    def test_visualize_recipe_all_formats(self):
-        """Test recipe visualization with all formats."""
-        agent = IntegratedCoffeeAgent()
-        recipe = {
-            "bean": {
-                "name": "Test Bean",
-                "flavor_notes": ["chocolate", "caramel"]
-            },
-            "brewing": {
-                "brewer": "V60",
-                "temperature": 92,
-                "grinding_size": 22,
-                "dose": 18,
-                "target_water": 288,
-                "pours": [{"start": 0, "end": 30, "water_added": 288}]
-            }
-        }
-        
-        result = agent.visualize_recipe(recipe, output_formats=["html", "mermaid", "ascii"])
+    @pytest.mark.parametrize(
+        "output_formats",
+        [["html", "ascii"], ["html", "mermaid", "ascii"]],
+    )
+    def test_visualize_recipe(self, integrated_agent, sample_recipe, output_formats):
+        """Test recipe visualization for each requested format set."""
+        result = integrated_agent.visualize_recipe(sample_recipe, output_formats=output_formats)
         assert isinstance(result, dict)
-
+        # Visualization agent should return every requested format
+        assert set(result) == set(output_formats)
@@ -4,323 +4,112 @@ Enhanced version with improved single-line timeline visualization.
 """
 
 import json
-from typing import Dict, List, Any, Optional
+import time
+from itertools import accumulate
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from dataclasses import dataclass
-from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore[assignment]
 
-@dataclass
-class BrewingStep:
-    """Represents a single brewing step."""
-    step_number: int
-    start_time: int
-    end_time: int
-    water_added: int
-    cumulative_water: int
-    action: str
-
-
-class CoffeeBrewVisualizationAgent:
-    """
-    Agent for generating visual flowcharts of coffee brewing recipes.
-    V2: Enhanced with single-line timeline visualization.
-    """
-
-    def __init__(self):
-        self.recipe_data = None
-        self.brewing_steps = []
-
-    def load_recipe(self, recipe: Dict[str, Any]) -> None:
-        """Load a recipe from JSON data."""
-        self.recipe_data = recipe
-        self.brewing_steps = self._parse_brewing_steps()
-
-    def load_recipe_from_file(self, filepath: str, recipe_index: int = 0) -> None:
-        """Load a recipe from a JSONL file."""
-        import re
-
-        with open(filepath, 'r') as f:
-            content = f.read()
-
-        # Parse JSON objects by counting braces
-        recipes = []
-        depth = 0
-        current_obj = ""
-
-        for char in content:
-            if char == '{':
-                if depth == 0:
-                    current_obj = char
-                else:
-                    current_obj += char
-                depth += 1
-            elif char == '}':
-                depth -= 1
-                current_obj += char
-                if depth == 0 and current_obj.strip():
-                    try:
-                        recipes.append(json.loads(current_obj))
-                    except json.JSONDecodeError as e:
-                        print(f"Warning: Skipping invalid JSON object: {e}")
-                    current_obj = ""
-            elif depth > 0:
-                current_obj += char
-
-        if recipe_index >= len(recipes):
-            raise ValueError(f"Recipe index {recipe_index} out of range (found {len(recipes)} recipes)")
-        self.load_recipe(recipes[recipe_index])
-
-    def _parse_brewing_steps(self) -> List[BrewingStep]:
-        """Parse the pours data into structured brewing steps."""
-        if not self.recipe_data:
-            return []
-
-        pours = self.recipe_data['brewing']['pours']
-        steps = []
-        cumulative_water = 0
-
-        for i, pour in enumerate(pours, 1):
-            cumulative_water += pour['water_added']
-
-            # Determine the action type
-            if i == 1:
-                action = "BLOOM"
-            elif i == len(pours):
-                action = "FINAL POUR"
-            else:
-                action = f"POUR #{i}"
-
-            step = BrewingStep(
-                step_number=i,
-                start_time=pour['start'],
-                end_time=pour['end'],
-                water_added=pour['water_added'],
-                cumulative_water=cumulative_water,
-                action=action
-            )
-            steps.append(step)
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so one except clause covers both.
+_json_loads = orjson.loads if orjson is not None else json.loads
 
-        return steps
 
-    def _generate_single_line_timeline_html(self) -> str:
-        """Generate a single horizontal timeline with markers at different times."""
-        total_time = self.brewing_steps[-1].end_time
-        brewing = self.recipe_data['brewing']
-
-        # Calculate positions for each event
-        events = []
-
-        # Start event
-        events.append({
-            'time': 0,
-            'position': 0,
-            'label': 'START',
-            'description': f'Begin brewing',
-            'icon': '▶️'
-        })
-
-        # Pour events
-        for step in self.brewing_steps:
-            events.append({
-                'time': step.start_time,
-                'position': (step.start_time / total_time) * 100,
-                'label': f'{step.action}',
-                'description': f'Add {step.water_added}ml',
-                'icon': '💧'
-            })
-
-        # End event
-        events.append({
-            'time': total_time,
-            'position': 100,
-            'label': 'FINISH',
-            'description': f'Total: {brewing["target_water"]}ml',
-            'icon': '✓'
-        })
-
-        # Generate event markers HTML
-        event_markers = []
-        for i, event in enumerate(events):
-            # Alternate positions above/below line
-            is_above = i % 2 == 0
-            marker_class = 'above' if is_above else 'below'
-
-            event_markers.append(f"""
-            <div class="timeline-event {marker_class}" style="left: {event['position']:.1f}%;">
-                <div class="event-marker"></div>
-                <div class="event-label">
-                    <div class="event-icon">{event['icon']}</div>
-                    <div class="event-time">{event['time']}s</div>
-                    <div class="event-name">{event['label']}</div>
-                    <div class="event-desc">{event['description']}</div>
-                </div>
-            </div>
-            """)
-
-        return f"""
-        <div class="single-line-timeline">
-            <h2>⏱️ Timeline Chart</h2>
-            <div class="timeline-container">
-                <div class="timeline-line"></div>
-                {''.join(event_markers)}
-            </div>
-        </div>
-        """
-
-    def _generate_brewing_timeline_html(self) -> str:
-        """Generate detailed brewing timeline with steps."""
-        total_time = self.brewing_steps[-1].end_time
-        target_water = self.recipe_data['brewing']['target_water']
-
-        timeline_items = []
-        for step in self.brewing_steps:
-            percentage = (step.cumulative_water / target_water) * 100
-            duration = step.end_time - step.start_time
-
-            timeline_items.append(f"""
-            <div class="timeline-item">
-                <div class="timeline-marker">{step.step_number}</div>
-                <div class="timeline-content">
-                    <div class="timeline-header">
-                        <h3>{step.action}</h3>
-                        <span class="timeline-time">{step.start_time}s - {step.end_time}s</span>
-                    </div>
-                    <div class="timeline-details">
-                        <p>💧 Add <strong>{step.water_added}ml</strong> water over <strong>{duration}s</strong></p>
-                        <p>📊 Progress: <strong>{step.cumulative_water}ml</strong> / {target_water}ml ({percentage:.0f}%)</p>
-                    </div>
-                    <div class="progress-bar">
-                        <div class="progress-fill" style="width: {percentage}%"></div>
-                    </div>
-                </div>
-            </div>
-            """)
-
-        return f"""
-        <div class="brewing-timeline">
-            <h2>📋 Brewing Timeline</h2>
-            {''.join(timeline_items)}
-        </div>
-        """
-
-    def generate_html_visualization(self, include_mermaid: bool = False) -> str:
-        """
-        Generate an HTML page with the improved visualization layout.
-
-        Layout (top to bottom):
-        1. Parameters (info cards)
-        2. Timeline Chart (single line with markers)
-        3. Brewing Timeline (detailed steps)
-        4. Expected Flavor Notes
-        """
-        if not self.recipe_data:
-            raise ValueError("No recipe loaded")
-
-        brewing = self.recipe_data['brewing']
-        bean = self.recipe_data['bean']
-
-        # Generate sections
-        single_line_timeline = self._generate_single_line_timeline_html()
-        brewing_timeline = self._generate_brewing_timeline_html()
-
-        html = f"""
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>DailyDrip - {bean['name']} Recipe</title>
-    <style>
-        * {{
+# Static stylesheet for generate_html_visualization, kept out of the per-call f-string.
+_HTML_STYLE = """\
+        * {
             margin: 0;
             padding: 0;
             box-sizing: border-box;
-        }}
+        }
 
-        body {{
+        body {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
             background: linear-gradient(135deg, #fdf8f6 0%, #f2e8e5 100%);
             padding: 20px;
             min-height: 100vh;
-        }}
+        }
 
-        .container {{
+        .container {
             max-width: 1200px;
             margin: 0 auto;
             background: white;
             border-radius: 20px;
             box-shadow: 0 20px 60px rgba(0,0,0,0.3);
             overflow: hidden;
-        }}
+        }
 
-        .header {{
+        .header {
             background: linear-gradient(135deg, #6B4423 0%, #3D2817 100%);
             color: white;
             padding: 40px;
             text-align: center;
-        }}
+        }
 
-        .header h1 {{
+        .header h1 {
             font-size: 2.5em;
             margin-bottom: 10px;
-        }}
+        }
 
-        .header .subtitle {{
+        .header .subtitle {
             font-size: 1.2em;
             opacity: 0.9;
-        }}
+        }
 
-        .content {{
+        .content {
             padding: 40px;
-        }}
+        }
 
         /* === PARAMETERS SECTION === */
-        .info-grid {{
+        .info-grid {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 20px;
             margin-bottom: 50px;
-        }}
+        }
 
-        .info-card {{
+        .info-card {
             background: #f8f9fa;
             padding: 20px;
             border-radius: 10px;
             border-left: 4px solid #b27946;
-        }}
+        }
 
-        .info-card h3 {{
+        .info-card h3 {
             color: #333;
             margin-bottom: 10px;
             font-size: 0.9em;
             text-transform: uppercase;
             letter-spacing: 1px;
-        }}
+        }
 
-        .info-card .value {{
+        .info-card .value {
             font-size: 1.5em;
             color: #744527;
             font-weight: bold;
-        }}
+        }
 
         /* === SINGLE LINE TIMELINE === */
-        .single-line-timeline {{
+        .single-line-timeline {
             margin: 40px 0 60px 0;
-        }}
+        }
 
-        .single-line-timeline h2 {{
+        .single-line-timeline h2 {
             margin-bottom: 40px;
             color: #333;
             font-size: 1.8em;
-        }}
+        }
 
-        .timeline-container {{
+        .timeline-container {
             position: relative;
             height: 250px;
             margin: 40px 20px;
-        }}
+        }
 
-        .timeline-line {{
+        .timeline-line {
             position: absolute;
             top: 50%;
             left: 0;
@@ -329,15 +118,15 @@ class CoffeeBrewVisualizationAgent:
             background: linear-gradient(90deg, #d9b28c 0%, #744527 100%);
             border-radius: 2px;
             box-shadow: 0 2px 8px rgba(116, 69, 39, 0.25);
-        }}
+        }
 
-        .timeline-event {{
+        .timeline-event {
             position: absolute;
             top: 50%;
             transform: translateX(-50%);
-        }}
+        }
 
-        .event-marker {{
+        .event-marker {
             position: absolute;
             left: 50%;
             top: 50%;
@@ -350,15 +139,15 @@ class CoffeeBrewVisualizationAgent:
             box-shadow: 0 2px 8px rgba(116, 69, 39, 0.35);
             z-index: 2;
             transition: all 0.3s ease;
-        }}
+        }
 
-        .timeline-event:hover .event-marker {{
+        .timeline-event:hover .event-marker {
             width: 20px;
             height: 20px;
             border-width: 5px;
-        }}
+        }
 
-        .event-label {{
+        .event-label {
             position: absolute;
             left: 50%;
             transform: translateX(-50%);
@@ -370,66 +159,66 @@ class CoffeeBrewVisualizationAgent:
             box-shadow: 0 4px 16px rgba(0, 0, 0, 0.15);
             border: 2px solid #e0e0e0;
             transition: all 0.3s ease;
-        }}
+        }
 
-        .timeline-event:hover .event-label {{
+        .timeline-event:hover .event-label {
             box-shadow: 0 6px 20px rgba(0, 0, 0, 0.2);
             border-color: #b27946;
-        }}
+        }
 
-        .timeline-event.above .event-label {{
+        .timeline-event.above .event-label {
             bottom: 40px;
-        }}
+        }
 
-        .timeline-event.below .event-label {{
+        .timeline-event.below .event-label {
             top: 40px;
-        }}
+        }
 
-        .event-icon {{
+        .event-icon {
             font-size: 24px;
             margin-bottom: 5px;
-        }}
+        }
 
-        .event-time {{
+        .event-time {
             font-size: 14px;
             color: #744527;
             font-weight: bold;
             margin-bottom: 3px;
-        }}
+        }
 
-        .event-name {{
+        .event-name {
             font-size: 12px;
             color: #333;
             font-weight: 600;
             text-transform: uppercase;
             letter-spacing: 0.5px;
             margin-bottom: 3px;
-        }}
+        }
 
-        .event-desc {{
+        .event-desc {
             font-size: 11px;
             color: #666;
-        }}
+        }
 
         /* === BREWING TIMELINE === */
-        .brewing-timeline {{
+        .brewing-timeline {
             margin: 50px 0;
-        }}
+        }
 
-        .brewing-timeline h2 {{
+        .brewing-timeline h2 {
             margin-bottom: 30px;
             color: #333;
             font-size: 1.8em;
-        }}
+        }
 
-        .timeline-item {{
+        .timeline-item {
             display: flex;
             gap: 20px;
             margin-bottom: 30px;
             position: relative;
-        }}
+        }
 
-        .timeline-item:not(:last-child)::after {{
+        .timeline-item:not(:last-child)::after {
             content: '';
             position: absolute;
             left: 19px;
@@ -437,9 +226,9 @@ class CoffeeBrewVisualizationAgent:
             bottom: -30px;
             width: 2px;
             background: #e0e0e0;
-        }}
+        }
 
-        .timeline-marker {{
+        .timeline-marker {
             width: 40px;
             height: 40px;
             background: #b27946;
@@ -451,84 +240,84 @@ class CoffeeBrewVisualizationAgent:
             font-weight: bold;
             flex-shrink: 0;
             box-shadow: 0 2px 8px rgba(116, 69, 39, 0.35);
-        }}
+        }
 
-        .timeline-content {{
+        .timeline-content {
             flex: 1;
             background: #f8f9fa;
             padding: 20px;
             border-radius: 10px;
             border-left: 3px solid #b27946;
             transition: all 0.3s ease;
-        }}
+        }
 
-        .timeline-content:hover {{
+        .timeline-content:hover {
             box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1);
             transform: translateX(5px);
-        }}
+        }
 
-        .timeline-header {{
+        .timeline-header {
             display: flex;
             justify-content: space-between;
             align-items: center;
             margin-bottom: 15px;
-        }}
+        }
 
-        .timeline-header h3 {{
+        .timeline-header h3 {
             color: #333;
             margin: 0;
-        }}
+        }
 
-        .timeline-time {{
+        .timeline-time {
             color: #744527;
             font-weight: bold;
             font-size: 0.9em;
-        }}
+        }
 
-        .timeline-details {{
+        .timeline-details {
             margin-bottom: 15px;
-        }}
+        }
 
-        .timeline-details p {{
+        .timeline-details p {
             margin: 5px 0;
             color: #666;
-        }}
+        }
 
-        .progress-bar {{
+        .progress-bar {
             height: 8px;
             background: #e0e0e0;
             border-radius: 4px;
             overflow: hidden;
-        }}
+        }
 
-        .progress-fill {{
+        .progress-fill {
             height: 100%;
             background: linear-gradient(90deg, #d9b28c 0%, #744527 100%);
             transition: width 0.3s ease;
-        }}
+        }
 
         /* === FLAVOR NOTES === */
-        .flavor-notes {{
+        .flavor-notes {
             margin-top: 50px;
             padding: 30px;
             background: #fff3e0;
             border-radius: 15px;
             border: 2px solid #ffa726;
-        }}
+        }
 
-        .flavor-notes h3 {{
+        .flavor-notes h3 {
             color: #e65100;
             margin-bottom: 15px;
             font-size: 1.5em;
-        }}
+        }
 
-        .flavor-tags {{
+        .flavor-tags {
             display: flex;
             flex-wrap: wrap;
             gap: 10px;
-        }}
+        }
 
-        .flavor-tag {{
+        .flavor-tag {
             background: #ff9800;
             color: white;
             padding: 10px 18px;
@@ -536,44 +325,273 @@ class CoffeeBrewVisualizationAgent:
             font-size: 0.95em;
             font-weight: 500;
             transition: all 0.3s ease;
-        }}
+        }
 
-        .flavor-tag:hover {{
+        .flavor-tag:hover {
             background: #f57c00;
             transform: translateY(-2px);
             box-shadow: 0 4px 12px rgba(255, 152, 0, 0.4);
-        }}
+        }
 
         /* === FOOTER === */
-        .footer {{
+        .footer {
             text-align: center;
             padding: 25px;
             background: #f8f9fa;
             color: #666;
             font-size: 0.9em;
             border-top: 1px solid #e0e0e0;
-        }}
+        }
 
         /* === RESPONSIVE === */
-        @media (max-width: 768px) {{
-            .timeline-container {{
+        @media (max-width: 768px) {
+            .timeline-container {
                 height: 300px;
                 margin: 40px 10px;
-            }}
+            }
 
-            .event-label {{
+            .event-label {
                 font-size: 0.85em;
                 padding: 8px 12px;
-            }}
+            }
 
-            .header h1 {{
+            .header h1 {
                 font-size: 2em;
-            }}
+            }
 
-            .content {{
+            .content {
                 padding: 20px;
-            }}
-        }}
+            }
+        }"""
+_HTML_STYLE_BYTES = _HTML_STYLE.encode("utf-8")
+
+
+@dataclass(frozen=True)
+class BrewingStep:
+    """Represents a single brewing step, with render-ready aggregates computed at parse time."""
+    step_number: int
+    start_time: int
+    end_time: int
+    water_added: int
+    cumulative_water: int
+    action: str
+    duration: int = 0
+    percentage: float = 0.0  # cumulative water as % of target_water
+    position: float = 0.0  # start time as % of total brew time
+
+
+class CoffeeBrewVisualizationAgent:
+    """
+    Agent for generating visual flowcharts of coffee brewing recipes.
+    V2: Enhanced with single-line timeline visualization.
+    """
+
+    def __init__(self):
+        self.recipe_data = None
+        self.brewing_steps = []
+        self._total_time = 0
+        self._target_water = 0
+
+    def load_recipe(self, recipe: Dict[str, Any]) -> None:
+        """Load a recipe from JSON data."""
+        self.recipe_data = recipe
+        self.brewing_steps = self._parse_brewing_steps()
+
+    def load_recipe_from_file(self, filepath: str, recipe_index: int = 0) -> None:
+        """Load a recipe from a JSONL file (or a file of concatenated JSON objects)."""
+        found = 0
+        for recipe in self._iter_json_objects(filepath):
+            if found == recipe_index:
+                self.load_recipe(recipe)
+                return
+            found += 1
+        raise ValueError(f"Recipe index {recipe_index} out of range (found {found} recipes)")
+
+    @staticmethod
+    def _iter_json_objects(filepath: str) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield JSON objects, one per line (the dict elements of a line holding
+        a JSON array are yielded in order).
+
+        If a line is not a complete object (e.g. pretty-printed records), rescan the
+        file with ``JSONDecoder.raw_decode``, skipping the objects already yielded.
+        """
+        yielded = 0
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = _json_loads(line)
+                except json.JSONDecodeError:
+                    break
+                # A compact JSON array on one line holds the records themselves.
+                for record in obj if isinstance(obj, list) else (obj,):
+                    if isinstance(record, dict):
+                        yield record
+                        yielded += 1
+            else:
+                return
+            f.seek(0)
+            content = f.read()
+
+        decoder = json.JSONDecoder()
+        index = 0
+        pos = content.find('{')
+        while pos != -1:
+            try:
+                obj, pos = decoder.raw_decode(content, pos)
+            except json.JSONDecodeError as e:
+                print(f"Warning: Skipping invalid JSON object: {e}")
+                pos = content.find('\n{', pos + 1)
+                if pos == -1:
+                    return
+                pos += 1
+                continue
+            if index >= yielded:
+                yield obj
+            index += 1
+            pos = content.find('{', pos)
+
+    def _parse_brewing_steps(self) -> List[BrewingStep]:
+        """Parse the pours data into structured brewing steps."""
+        if not self.recipe_data:
+            return []
+
+        pours = self.recipe_data['brewing']['pours']
+        self._target_water = target_water = self.recipe_data['brewing']['target_water']
+        self._total_time = total_time = pours[-1]['end'] if pours else 0
+        last = len(pours)
+        # Running water totals come from itertools.accumulate's C loop.
+        cumulative = accumulate(pour['water_added'] for pour in pours)
+
+        return [
+            BrewingStep(
+                step_number=i,
+                start_time=pour['start'],
+                end_time=pour['end'],
+                water_added=pour['water_added'],
+                cumulative_water=cumulative_water,
+                # Determine the action type
+                action="BLOOM" if i == 1 else "FINAL POUR" if i == last else f"POUR #{i}",
+                duration=pour['end'] - pour['start'],
+                percentage=(cumulative_water / target_water) * 100 if target_water else 0.0,
+                position=(pour['start'] / total_time) * 100 if total_time else 0.0,
+            )
+            for i, (pour, cumulative_water) in enumerate(zip(pours, cumulative), 1)
+        ]
+
+    def _generate_single_line_timeline_html(self) -> str:
+        """Generate a single horizontal timeline with markers at different times."""
+        total_time = self._total_time
+        brewing = self.recipe_data['brewing']
+
+        # (time, position %, label, description, icon) for start, each pour, and finish
+        events = [
+            (0, 0, 'START', 'Begin brewing', '▶️'),
+            *(
+                (step.start_time, step.position, step.action,
+                 f'Add {step.water_added}ml', '💧')
+                for step in self.brewing_steps
+            ),
+            (total_time, 100, 'FINISH', f'Total: {brewing["target_water"]}ml', '✓'),
+        ]
+
+        # Generate event markers HTML, alternating positions above/below the line.
+        # A list comprehension + ''.join measures faster than io.StringIO writes here.
+        event_markers = [
+            f"""
+            <div class="timeline-event {'above' if i % 2 == 0 else 'below'}" style="left: {position:.1f}%;">
+                <div class="event-marker"></div>
+                <div class="event-label">
+                    <div class="event-icon">{icon}</div>
+                    <div class="event-time">{time}s</div>
+                    <div class="event-name">{label}</div>
+                    <div class="event-desc">{description}</div>
+                </div>
+            </div>
+            """
+            for i, (time, position, label, description, icon) in enumerate(events)
+        ]
+
+        return f"""
+        <div class="single-line-timeline">
+            <h2>⏱️ Timeline Chart</h2>
+            <div class="timeline-container">
+                <div class="timeline-line"></div>
+                {''.join(event_markers)}
+            </div>
+        </div>
+        """
+
+    def _generate_brewing_timeline_html(self) -> str:
+        """Generate detailed brewing timeline with steps."""
+        target_water = self._target_water
+        timeline_items = [
+            f"""
+            <div class="timeline-item">
+                <div class="timeline-marker">{step.step_number}</div>
+                <div class="timeline-content">
+                    <div class="timeline-header">
+                        <h3>{step.action}</h3>
+                        <span class="timeline-time">{step.start_time}s - {step.end_time}s</span>
+                    </div>
+                    <div class="timeline-details">
+                        <p>💧 Add <strong>{step.water_added}ml</strong> water over <strong>{step.duration}s</strong></p>
+                        <p>📊 Progress: <strong>{step.cumulative_water}ml</strong> / {target_water}ml ({step.percentage:.0f}%)</p>
+                    </div>
+                    <div class="progress-bar">
+                        <div class="progress-fill" style="width: {step.percentage}%"></div>
+                    </div>
+                </div>
+            </div>
+            """
+            for step in self.brewing_steps
+        ]
+
+        return f"""
+        <div class="brewing-timeline">
+            <h2>📋 Brewing Timeline</h2>
+            {''.join(timeline_items)}
+        </div>
+        """
+
+    def generate_html_visualization(self, include_mermaid: bool = False) -> str:
+        """
+        Generate an HTML page with the improved visualization layout.
+
+        Layout (top to bottom):
+        1. Parameters (info cards)
+        2. Timeline Chart (single line with markers)
+        3. Brewing Timeline (detailed steps)
+        4. Expected Flavor Notes
+        """
+        head, tail = self._generate_html_parts()
+        return head + _HTML_STYLE + tail
+
+    def _generate_html_parts(self) -> Tuple[str, str]:
+        """Render the recipe-specific HTML before and after the static stylesheet."""
+        if not self.recipe_data:
+            raise ValueError("No recipe loaded")
+
+        brewing = self.recipe_data['brewing']
+        bean = self.recipe_data['bean']
+
+        # Generate sections
+        single_line_timeline = self._generate_single_line_timeline_html()
+        brewing_timeline = self._generate_brewing_timeline_html()
+
+        head = f"""
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>DailyDrip - {bean['name']} Recipe</title>
+    <style>
+"""
+        tail = f"""
     </style>
 </head>
 <body>
@@ -628,14 +646,14 @@ class CoffeeBrewVisualizationAgent:
         </div>
 
         <div class="footer">
-            Generated by DailyDrip Visualization Agent | {datetime.now().strftime("%Y-%m-%d %H:%M")}
+            Generated by DailyDrip Visualization Agent | {time.strftime("%Y-%m-%d %H:%M")}
         </div>
     </div>
 </body>
 </html>
         """
 
-        return html
+        return head, tail
 
     def generate_mermaid_flowchart(self) -> str:
         """Generate a Mermaid flowchart diagram."""
@@ -658,10 +676,9 @@ class CoffeeBrewVisualizationAgent:
         prev_node = "SETUP"
         for step in self.brewing_steps:
             node_id = f"STEP{step.step_number}"
-            duration = step.end_time - step.start_time
 
             lines.append("    ")
-            lines.append(f"    {node_id}[\"🌊 {step.action}<br/>━━━━━━━━━━<br/>Time: {step.start_time}s - {step.end_time}s ({duration}s)<br/>Add: {step.water_added}ml water<br/>Total: {step.cumulative_water}ml\"]")
+            lines.append(f"    {node_id}[\"🌊 {step.action}<br/>━━━━━━━━━━<br/>Time: {step.start_time}s - {step.end_time}s ({step.duration}s)<br/>Add: {step.water_added}ml water<br/>Total: {step.cumulative_water}ml\"]")
 
             if step.step_number == 1:
                 lines.append(f"    {prev_node} --> |Begin brewing| {node_id}")
@@ -698,25 +715,8 @@ class CoffeeBrewVisualizationAgent:
         brewing = self.recipe_data['brewing']
         bean = self.recipe_data['bean']
 
-        lines = []
-
-        def box(text: str, char: str = "═") -> List[str]:
-            """Create a box with text."""
-            text_lines = text.split('\n')
-            max_len = max(len(line) for line in text_lines)
-            result = []
-            result.append("╔" + char * (max_len + 2) + "╗")
-            for line in text_lines:
-                result.append("║ " + line.ljust(max_len) + " ║")
-            result.append("╚" + char * (max_len + 2) + "╝")
-            return result
-
-        def arrow() -> str:
-            return "          ↓"
-
         # Title
-        lines.extend(box(f"☕ COFFEE BREWING RECIPE\n{bean['name']}", "═"))
-        lines.append(arrow())
+        sections = [(f"☕ COFFEE BREWING RECIPE\n{bean['name']}", "═")]
 
         # Setup
         setup_text = f"""⚙️  SETUP
@@ -726,41 +726,58 @@ Water Temp: {brewing['temperature']}°C
 Brewer: {brewing['brewer']}
 Target Water: {brewing['target_water']}ml
 Ratio: 1:{brewing['target_water']/brewing['dose']:.1f}"""
-        lines.extend(box(setup_text, "─"))
-        lines.append(arrow())
+        sections.append((setup_text, "─"))
 
         # Each pour step
         for step in self.brewing_steps:
-            duration = step.end_time - step.start_time
             step_text = f"""🌊 {step.action}
-Time: {step.start_time}s → {step.end_time}s (duration: {duration}s)
+Time: {step.start_time}s → {step.end_time}s (duration: {step.duration}s)
 Water: {step.water_added}ml
 Cumulative: {step.cumulative_water}ml / {brewing['target_water']}ml"""
-            lines.extend(box(step_text, "─"))
-            lines.append(arrow())
+            sections.append((step_text, "─"))
 
         # Finish
         finish_text = f"""✓ BREWING COMPLETE
 Total Water: {brewing['target_water']}ml
-Total Time: {self.brewing_steps[-1].end_time}s (~{self.brewing_steps[-1].end_time//60}m {self.brewing_steps[-1].end_time%60}s)
+Total Time: {self._total_time}s (~{self._total_time//60}m {self._total_time%60}s)
 Expected Yield: ~{brewing['target_water'] - brewing['dose']*2}ml"""
-        lines.extend(box(finish_text, "═"))
+        sections.append((finish_text, "═"))
+
+        # Every box shares one width, so the borders are built once per style.
+        split_sections = [(text.split('\n'), char) for text, char in sections]
+        width = max(len(line) for text_lines, _ in split_sections for line in text_lines)
+        borders = {
+            char: ("╔" + char * (width + 2) + "╗", "╚" + char * (width + 2) + "╝")
+            for char in ("═", "─")
+        }
+
+        lines: List[str] = []
+        for i, (text_lines, char) in enumerate(split_sections):
+            if i:
+                lines.append("          ↓")
+            top, bottom = borders[char]
+            lines.append(top)
+            lines.extend(["║ " + line.ljust(width) + " ║" for line in text_lines])
+            lines.append(bottom)
 
         return "\n".join(lines)
 
     def save_visualization(self, output_path: str, format: str = 'html') -> None:
         """Save the visualization to a file."""
         if format == 'html':
-            content = self.generate_html_visualization()
+            # Stream the pre-encoded stylesheet between the two rendered halves instead
+            # of joining and re-encoding the full page.
+            head, tail = self._generate_html_parts()
+            parts = (head.encode('utf-8'), _HTML_STYLE_BYTES, tail.encode('utf-8'))
         elif format == 'mermaid':
-            content = self.generate_mermaid_flowchart()
+            parts = (self.generate_mermaid_flowchart().encode('utf-8'),)
         elif format == 'ascii':
-            content = self.generate_ascii_flowchart()
+            parts = (self.generate_ascii_flowchart().encode('utf-8'),)
         else:
             raise ValueError(f"Unsupported format: {format}")
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        with open(output_path, 'wb') as f:
+            f.writelines(parts)
 
         print(f"✓ Visualization saved to: {output_path}")
 
@@ -775,7 +792,7 @@ Expected Yield: ~{brewing['target_water'] - brewing['dose']*2}ml"""
         return {
             'bean_name': bean['name'],
             'brewer': brewing['brewer'],
-            'total_time': self.brewing_steps[-1].end_time if self.brewing_steps else 0,
+            'total_time': self._total_time,
             'total_water': brewing['target_water'],
             'coffee_dose': brewing['dose'],
             'ratio': f"1:{brewing['target_water']/brewing['dose']:.1f}",
@@ -1,24 +1,63 @@
-import json, argparse
+import hashlib, json, argparse, os
+from contextlib import nullcontext
+from functools import partial
+from multiprocessing import Pool
 from pathlib import Path
 from tqdm import tqdm
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore[assignment]
+
+if orjson is not None:
+    _loads, _dumps = orjson.loads, orjson.dumps
+else:  # pragma: no cover - optional dependency
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+def process(line: bytes, max_chars: int) -> bytes:
+    """Chunk one JSONL record and return its chunk lines as UTF-8 bytes."""
+    rec = _loads(line); text = rec["text"]
+    # Records without an id get a stable digest of the raw line (text + meta), so
+    # re-chunking yields the same ids and distinct records never share one.
+    rec_id = rec.get('id') or hashlib.blake2b(line.rstrip(b"\r\n"), digest_size=8).hexdigest()
+    # Meta is identical for every chunk of a record: serialize it once and splice
+    # each chunk's JSON from bytes, then write the whole record in one call.
+    tail = b',"meta":' + _dumps(rec["meta"]) + b'}\n'
+    buf = bytearray()
+    for i in range(0, len(text), max_chars):
+        buf += b'{"id":' + _dumps(f"{rec_id}_{i}") + b',"text":' + _dumps(text[i:i+max_chars]) + tail
+    return bytes(buf)
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--records', required=True)
     ap.add_argument('--out', required=True)
     ap.add_argument('--max_chars', type=int, default=800)
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1)
     args = ap.parse_args()
 
     src = Path(args.records); dst = Path(args.out)
     dst.parent.mkdir(parents=True, exist_ok=True)
+    work = partial(process, max_chars=args.max_chars)
 
-    with src.open() as f_in, dst.open('w', encoding='utf-8') as f_out:
-        for line in tqdm(f_in, desc="chunking"):
-            rec = json.loads(line); text = rec["text"]
-            for i in range(0, len(text), args.max_chars):
-                chunk = {"id": f"{rec.get('id','')}_{i}", "text": text[i:i+args.max_chars], "meta": rec["meta"]}
-                f_out.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+    # Binary I/O: orjson decodes bytes and emits UTF-8 bytes, so no text-layer re-encoding.
+    with src.open('rb') as f_in, dst.open('wb', buffering=1 << 20) as f_out, \
+            (Pool(args.workers) if args.workers > 1 else nullcontext()) as pool, \
+            tqdm(desc="chunking", unit="rec") as pbar:
+        # Records are independent and the index does not care about line order,
+        # so workers return results as soon as they finish.
+        results = pool.imap_unordered(work, f_in, chunksize=64) if pool else map(work, f_in)
+        n = 0
+        for n, payload in enumerate(results, 1):
+            f_out.write(payload)
+            if n % 1000 == 0:  # tick the bar per 1000 records, not per line
+                pbar.update(1000)
+        pbar.update(n % 1000)
     print(f"Wrote chunks to {dst}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,25 @@
-import json, argparse
-import pandas as pd
+import argparse
+import csv
+import hashlib
+import json
+from contextlib import nullcontext
+from itertools import islice
+from multiprocessing import Pool
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore[assignment]
+
+if orjson is not None:
+    _loads, _dumps = orjson.loads, orjson.dumps
+else:  # pragma: no cover - optional dependency
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
 # Fields used to build the retrievable "bean text"
 BEAN_COLUMNS = [
     "bean.name", "bean.process", "bean.variety", "bean.region",
@@ -9,13 +27,20 @@ BEAN_COLUMNS = [
 ]
 
 def flatten(d, parent_key="", sep="."):
+    # Iterative walk over (prefix, items iterator) pairs: one output dict, no
+    # recursive calls or intermediate dicts, and keys stay in depth-first order.
     out = {}
-    for k, v in d.items():
-        key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            out.update(flatten(v, key, sep=sep))
-        else:
+    stack = [(parent_key, iter(d.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            key = f"{prefix}{sep}{k}" if prefix else k
+            if type(v) is dict or isinstance(v, dict):
+                stack.append((key, iter(v.items())))
+                break
             out[key] = v
+        else:
+            stack.pop()
     return out
 
 def list_to_str(v):
@@ -34,7 +59,7 @@ def bean_text(flat: dict) -> str:
     for k in BEAN_COLUMNS:
         v = flat.get(k)
         v = list_to_str(v)
-        if v is None or (isinstance(v, float) and pd.isna(v)): 
+        if v is None or (isinstance(v, float) and v != v):  # None or NaN
             continue
         parts.append(f"{k}: {v}")
     return " | ".join(parts)
@@ -48,101 +73,244 @@ def make_record(obj: dict) -> dict:
 
     text = bean_text(flat)  # <— embedding text based on bean profile only
     rid_base = str(flat.get("id") or flat.get("uuid") or flat.get("bean.name") or "")
-    rid = (rid_base if rid_base else "row") + "-" + str(abs(hash(text)))[-6:]
+    # blake2b rather than hash(): str hashes are salted per process, so re-ingesting
+    # the same data would mint new ids and duplicate it on upsert.
+    suffix = hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()[-6:]
+    rid = (rid_base if rid_base else "row") + "-" + suffix
     return {"id": rid, "text": text, "meta": flat}
 
-def iter_json_any(path: str):
-    """Yield JSON objects from JSON, JSON array, JSONL, or concatenated pretty JSON."""
-    with open(path, "r", encoding="utf-8") as f:
-        s = f.read()
-
-    # Try whole JSON first
+def _iter_json_values(s: bytes):
+    """Yield the top-level values of one JSON document or of concatenated JSON text."""
     try:
-        data = json.loads(s)
-        if isinstance(data, list):
-            for it in data: yield it
-        else:
-            yield data
-        return
+        data = _loads(s)
     except json.JSONDecodeError:
         pass
-
-    # Try JSONL
-    try_lines = True
-    for line in s.splitlines():
-        line = line.strip()
-        if not line: 
-            continue
-        try:
-            yield json.loads(line)
-        except json.JSONDecodeError:
-            try_lines = False
-            break
-    if try_lines:
+    else:
+        yield data
         return
 
-    # Fallback: concatenated JSON objects
+    # Concatenated JSON objects (raw_decode needs text)
+    s = s.decode("utf-8")
     dec = json.JSONDecoder(); i = 0; n = len(s)
     while i < n:
         while i < n and s[i].isspace(): i += 1
         if i >= n: break
         obj, end = dec.raw_decode(s, i)
-        if isinstance(obj, list):
-            for it in obj: yield it
-        else:
-            yield obj
+        yield obj
         i = end
 
+def iter_json_any(path: str):
+    """Yield JSON objects from JSON, JSON array, JSONL, or concatenated pretty JSON."""
+    # JSONL is streamed line by line. Only when a line does not parse on its own
+    # (pretty-printed or concatenated input) is the whole file read, skipping the
+    # values already yielded from the lines before it.
+    done = 0
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = _loads(line)
+            except json.JSONDecodeError:
+                break
+            if isinstance(data, list):
+                yield from data
+            else:
+                yield data
+            done += 1
+        else:
+            return
+        f.seek(0)
+        s = f.read()
+
+    for data in islice(_iter_json_values(s), done, None):
+        if isinstance(data, list):
+            yield from data
+        else:
+            yield data
+
+FLUSH_BYTES = 1 << 20
+
+# pandas.read_csv's default missing-value and boolean spellings
+_CSV_NA = frozenset({"", "NA", "N/A", "n/a", "NaN", "nan", "-nan", "null", "NULL", "None", "#N/A"})
+_CSV_BOOL = {"True": True, "TRUE": True, "true": True, "False": False, "FALSE": False, "false": False}
+
+def _coerce(v):
+    """
+    Type one CSV cell: missing -> None, then bool, int, float, or str. Typing is per
+    cell, not per column as in pandas, so a column mixing "12" and "fine" yields 12
+    next to "fine". Cells absent from short rows (None from DictReader) stay None.
+    """
+    if v is None or v in _CSV_NA:
+        return None
+    if v in _CSV_BOOL:
+        return _CSV_BOOL[v]
+    try:
+        return int(v)
+    except ValueError:
+        pass
+    try:
+        return float(v)
+    except ValueError:
+        return v
+
+def iter_csv(path: str):
+    """Stream CSV rows as dicts with numeric cells coerced, one row in memory at a time."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            yield {k: _coerce(v) for k, v in row.items()}
+
+def write_records(f_out, records) -> None:
+    """Write records as JSONL, serialized into a bytearray flushed in ~1 MiB blocks."""
+    buf = bytearray()
+    for rec in records:
+        buf += _dumps(rec)
+        buf += b"\n"
+        if len(buf) >= FLUSH_BYTES:
+            f_out.write(buf)
+            buf.clear()
+    if buf:
+        f_out.write(buf)
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--csv", help="CSV input")
     ap.add_argument("--json", help="JSON input (single object or array)")
     ap.add_argument("--jsonl", help="JSONL or concatenated pretty JSON")
     ap.add_argument("--out", required=True)
+    ap.add_argument("--workers", type=int, default=1,
+                    help="processes building records; output order is preserved")
     args = ap.parse_args()
 
     if not (args.csv or args.json or args.jsonl):
         raise SystemExit("Provide one of --csv | --json | --jsonl")
 
     out = Path(args.out); out.parent.mkdir(parents=True, exist_ok=True)
-    with out.open("w", encoding="utf-8") as f_out:
-        if args.csv:
-            df = pd.read_csv(args.csv)
-            for _, r in df.iterrows():
-                f_out.write(json.dumps(make_record(r.to_dict()), ensure_ascii=False) + "\n")
-        else:
-            src = args.json or args.jsonl
-            for obj in iter_json_any(src):
-                f_out.write(json.dumps(make_record(obj), ensure_ascii=False) + "\n")
+    # Records are encoded straight to UTF-8 bytes, skipping the text layer, and
+    # reach the file in large blocks rather than one write per record.
+    with out.open("wb") as f_out, \
+            (Pool(args.workers) if args.workers > 1 else nullcontext()) as pool:
+        # Records are independent, so workers can build them; imap keeps input order.
+        build = (lambda fn, items: pool.imap(fn, items, chunksize=500)) if pool else map
+        # CSV rows are streamed with the csv module rather than loaded into a
+        # DataFrame first: nothing here is columnar once rows become records.
+        objs = iter_csv(args.csv) if args.csv else iter_json_any(args.json or args.jsonl)
+        write_records(f_out, build(make_record, objs))
 
     print(f"Wrote records to {out}")
 
 def sanitize_meta(meta: dict) -> dict:
+    # Same explicit-stack walk as index.sanitize_meta: nested dicts and lists of
+    # dicts keep their depth-first key order with no recursive call per level.
     out = {}
-    def put(k, v):
-        if isinstance(v, (str, int, float, bool)) or v is None:
-            out[k] = v
-        elif isinstance(v, list):
-            if v and all(isinstance(x, dict) for x in v):
-                # list of dicts -> flatten with indices
-                for idx, d in enumerate(v):
-                    for kk, vv in d.items():
-                        put(f"{k}.{idx}.{kk}", vv)
-            else:
+    stack = [("", iter(meta.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for kk, v in items:
+            k = f"{prefix}{kk}" if prefix else kk
+            if isinstance(v, (str, int, float, bool)) or v is None:
+                out[k] = v
+            elif isinstance(v, list):
+                if v and all(isinstance(x, dict) for x in v):
+                    # list of dicts -> flatten with indices
+                    stack.append((f"{k}.", ((f"{idx}.{dk}", dv) for idx, d in enumerate(v) for dk, dv in d.items())))
+                    break
                 out[k] = ", ".join(map(str, v))
-        elif isinstance(v, dict):
-            for kk, vv in v.items():
-                put(f"{k}.{kk}", vv)
+            elif isinstance(v, dict):
+                stack.append((f"{k}.", iter(v.items())))
+                break
+            else:
+                out[k] = str(v)
         else:
-            out[k] = str(v)
-    for k, v in meta.items():
-        put(k, v)
+            stack.pop()
     return out
 
-def ingest_records(records: list, collection) -> None:
+# Metadata key holding the record's brewing/evaluation sections as one JSON string
+PAYLOAD_KEY = "_payload"
+# Metadata key holding the record's precomputed evaluation score (0-1)
+EVAL_SCORE_KEY = "_eval_score"
+
+# HNSW settings for the coffee_chunks collection, passed by both the indexer and the
+# service, whichever creates it. Applied only at creation: larger insert batches and a
+# higher sync threshold mean fewer graph flushes during a bulk build. The distance
+# space is left at Chroma's default so the service's distance-based scores hold.
+# Chroma has no per-query search_ef, so the beam is sized for the deepest rerank
+# pool (k=10 x retrieval_multiplier=5, 4 candidates per result); construction_ef
+# builds a better-connected base graph for the same reason.
+HNSW_METADATA = {
+    "hnsw:batch_size": 10000,
+    "hnsw:sync_threshold": 50000,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 200,
+}
+
+JAG_KEYS = ["flavour_intensity", "acidity", "mouthfeel", "sweetness", "purchase_intent"]
+
+def meta_sections(meta: dict) -> dict:
+    """
+    Group the brewing.* and evaluation.* entries of sanitized metadata by section,
+    with the prefix stripped. None values are left out, as Chroma drops them.
+    """
+    sections = {"brewing": {}, "evaluation": {}}
+    for k, v in meta.items():
+        if v is None:
+            continue
+        section, sep, rest = k.partition(".")
+        if sep and section in sections:
+            sections[section][rest] = v
+    return sections
+
+def compute_evaluation_score(evaluation) -> float:
+    """
+    Compute a normalized evaluation score from 0.0 to 1.0.
+    """
+    if not evaluation:
+        return 0.0
+    
+    score = 0.0
+    weights_sum = 0.0
+    
+    # Liking score (0-10 scale) → 60% weight
+    liking = evaluation.get("liking")
+    if liking is not None:
+        try:
+            normalized_liking = float(liking) / 10.0  # normalize to 0-1
+            score += normalized_liking * 0.6
+            weights_sum += 0.6
+        except (ValueError, TypeError):
+            pass
+    
+    # JAG metrics (1-5 scale) → 40% weight (split equally)
+    jag = evaluation.get("jag", {})
+    if isinstance(jag, dict):
+        jag_values = []
+        for key in JAG_KEYS:
+            val = jag.get(key)
+            if val is not None:
+                try:
+                    normalized_val = (float(val) - 1.0) / 4.0  # normalize 1-5 to 0-1
+                    jag_values.append(normalized_val)
+                except (ValueError, TypeError):
+                    pass
+        
+        if jag_values:
+            jag_avg = sum(jag_values) / len(jag_values)
+            score += jag_avg * 0.4
+            weights_sum += 0.4
+    
+    if weights_sum > 0:
+        return score / weights_sum
+    return 0.0
+
+def ingest_records(records: list, collection, skip_unchanged: bool = False) -> int:
     """
     Ingest a list of records (dicts) into a ChromaDB collection.
     Each record is processed by make_record to generate ID, text, and meta.
+
+    With ``skip_unchanged``, records already stored with the same text and
+    metadata are left out of the upsert, so they are not re-embedded. Returns
+    the number of records upserted.
     """
     ids = []
     documents = []
@@ -154,7 +322,25 @@ def ingest_records(records: list, collection) -> None:
         documents.append(processed["text"])
         
         # Sanitize metadata for ChromaDB
-        metadatas.append(sanitize_meta(processed["meta"]))
+        meta = sanitize_meta(processed["meta"])
+        sections = meta_sections(meta)
+        meta[PAYLOAD_KEY] = _dumps(sections).decode("utf-8")
+        # Scored from the stored evaluation section, exactly as the service's
+        # fallback would score it at query time.
+        meta[EVAL_SCORE_KEY] = compute_evaluation_score(sections["evaluation"])
+        metadatas.append(meta)
+
+    if ids and skip_unchanged:
+        existing = collection.get(ids=ids, include=["documents", "metadatas"])
+        stored = dict(zip(existing["ids"], zip(existing["documents"], existing["metadatas"])))
+        # Chroma drops None-valued metadata keys on write, so compare without them.
+        changed = [
+            i for i, rid in enumerate(ids)
+            if stored.get(rid) != (documents[i], {k: v for k, v in metadatas[i].items() if v is not None})
+        ]
+        ids = [ids[i] for i in changed]
+        documents = [documents[i] for i in changed]
+        metadatas = [metadatas[i] for i in changed]
         
     if ids:
         collection.upsert(
@@ -162,6 +348,7 @@ def ingest_records(records: list, collection) -> None:
             documents=documents,
             metadatas=metadatas
         )
+    return len(ids)
 
 if __name__ == "__main__":
     main()
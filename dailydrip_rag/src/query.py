@@ -1,4 +1,6 @@
-import argparse, json
+import argparse, heapq, json, sys
+from functools import lru_cache
+import numpy as np
 import chromadb
 from chromadb.utils import embedding_functions
 
@@ -8,14 +10,31 @@ BEAN_COLUMNS = [
     "bean.roast_level", "bean.roasted_days", "bean.altitude", "bean.flavor_notes",
 ]
 
+# Metadata keys read for every result, built once at import instead of per call
+_JAG_KEYS = ("flavour_intensity", "acidity", "mouthfeel", "sweetness", "purchase_intent")
+EVAL_LIKING_KEY = "evaluation.liking"
+EVAL_JAG_KEYS = tuple((k, f"evaluation.jag.{k}") for k in _JAG_KEYS)
+BREWING_KEYS = tuple((k, f"brewing.{k}") for k in ("brewer", "temperature", "grinding_size", "dose", "target_water"))
+
+@lru_cache(maxsize=64)
+def _pour_keys(i: int):
+    return f"brewing.pours.{i}.start", f"brewing.pours.{i}.end", f"brewing.pours.{i}.water_added"
+
 def flatten(d, parent_key="", sep="."):
+    # Iterative walk over (prefix, items iterator) pairs: one output dict, no
+    # recursive calls or intermediate dicts, and keys stay in depth-first order.
     out = {}
-    for k, v in d.items():
-        key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            out.update(flatten(v, key, sep=sep))
-        else:
+    stack = [(parent_key, iter(d.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            key = f"{prefix}{sep}{k}" if prefix else k
+            if type(v) is dict or isinstance(v, dict):
+                stack.append((key, iter(v.items())))
+                break
             out[key] = v
+        else:
+            stack.pop()
     return out
 
 def list_to_str(v):
@@ -33,41 +52,36 @@ def bean_text_from_obj(obj: dict) -> str:
 
 def reconstruct_pours(meta: dict):
     """Rebuild pours from flattened keys brewing.pours.N.{start,end,water_added}"""
+    # Indices are written consecutively from 0 at index time, so probe them in
+    # order instead of scanning and splitting every metadata key.
     pours = []
-    idxs = set()
-    for k in meta.keys():
-        if k.startswith("brewing.pours."):
-            try:
-                idxs.add(int(k.split(".")[2]))
-            except Exception:
-                pass
-    for i in sorted(idxs):
+    i = 0
+    while True:
+        start, end, water = _pour_keys(i)
+        if start not in meta and end not in meta and water not in meta:
+            break
         pours.append({
-            "start": meta.get(f"brewing.pours.{i}.start"),
-            "end": meta.get(f"brewing.pours.{i}.end"),
-            "water_added": meta.get(f"brewing.pours.{i}.water_added"),
+            "start": meta.get(start),
+            "end": meta.get(end),
+            "water_added": meta.get(water),
         })
+        i += 1
     return pours
 
 def extract_brewing(meta: dict):
-    return {
-        "brewer": meta.get("brewing.brewer"),
-        "temperature": meta.get("brewing.temperature"),
-        "grinding_size": meta.get("brewing.grinding_size"),
-        "dose": meta.get("brewing.dose"),
-        "target_water": meta.get("brewing.target_water"),
-        "pours": reconstruct_pours(meta) or meta.get("brewing.pours_str"),
-    }
+    brewing = {short: meta.get(full) for short, full in BREWING_KEYS}
+    brewing["pours"] = reconstruct_pours(meta) or meta.get("brewing.pours_str")
+    return brewing
 
 def extract_evaluation(meta: dict):
     jag = {}
-    for k in ("flavour_intensity", "acidity", "mouthfeel", "sweetness", "purchase_intent"):
-        val = meta.get(f"evaluation.jag.{k}")
+    for short, full in EVAL_JAG_KEYS:
+        val = meta.get(full)
         if val is not None:
-            jag[k] = val
+            jag[short] = val
     out = {}
-    if "evaluation.liking" in meta:
-        out["liking"] = meta["evaluation.liking"]
+    if EVAL_LIKING_KEY in meta:
+        out["liking"] = meta[EVAL_LIKING_KEY]
     if jag:
         out["jag"] = jag
     return out or None
@@ -88,9 +102,8 @@ def compute_evaluation_score(evaluation):
     
     jag = evaluation.get("jag", {})
     if isinstance(jag, dict):
-        jag_keys = ["flavour_intensity", "acidity", "mouthfeel", "sweetness", "purchase_intent"]
         jag_values = []
-        for key in jag_keys:
+        for key in _JAG_KEYS:
             val = jag.get(key)
             if val is not None:
                 try:
@@ -103,45 +116,75 @@ def compute_evaluation_score(evaluation):
     
     return score / weights_sum if weights_sum > 0 else 0.0
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument('--persist-dir', required=True)
-    ap.add_argument('--q', help="free-text query")
-    ap.add_argument('--bean-json', help="path to JSON with a 'bean' object (or full record)")
-    ap.add_argument('--bean-inline', help="inline JSON string with a 'bean' object (or full record)")
-    ap.add_argument('--k', type=int, default=5)
-    ap.add_argument('--json', action='store_true', help="output JSON")
-    
-    # Reranking parameters
-    ap.add_argument('--use-reranking', action='store_true', default=True, help="enable evaluation-based reranking")
-    ap.add_argument('--no-reranking', dest='use_reranking', action='store_false', help="disable reranking")
-    ap.add_argument('--similarity-weight', type=float, default=0.7, help="weight for similarity (0-1), default 0.7")
-    ap.add_argument('--retrieval-multiplier', type=int, default=3, help="fetch k × multiplier results before reranking")
-    
-    args = ap.parse_args()
+def _to_float(v):
+    try:
+        return float(v)
+    except (ValueError, TypeError):
+        return np.nan
 
-    # Build query text from structured bean or free text
-    if args.bean_json or args.bean_inline:
-        if args.bean_json:
-            with open(args.bean_json, "r", encoding="utf-8") as f:
-                bean_obj = json.load(f)
-        else:
-            bean_obj = json.loads(args.bean_inline)
-        q_text = bean_text_from_obj(bean_obj)
-    elif args.q:
-        q_text = args.q
-    else:
-        raise SystemExit("Provide --bean-json or --bean-inline or --q")
+def evaluation_scores(evaluations) -> np.ndarray:
+    """compute_evaluation_score over many candidates as array arithmetic.
+
+    One pass fills liking/JAG arrays (NaN where missing or unparseable); the
+    weighting and normalization then run once over all candidates.
+    """
+    n = len(evaluations)
+    liking = np.full(n, np.nan)
+    jag = np.full((n, len(_JAG_KEYS)), np.nan)
+    for i, evaluation in enumerate(evaluations):
+        if not evaluation:
+            continue
+        val = evaluation.get("liking")
+        if val is not None:
+            liking[i] = _to_float(val)
+        jag_obj = evaluation.get("jag", {})
+        if isinstance(jag_obj, dict):
+            for j, key in enumerate(_JAG_KEYS):
+                val = jag_obj.get(key)
+                if val is not None:
+                    jag[i, j] = _to_float(val)
+
+    has_liking = ~np.isnan(liking)
+    jag_present = ~np.isnan(jag)
+    jag_count = jag_present.sum(axis=1)
+    has_jag = jag_count > 0
+    jag_sum = np.where(jag_present, (jag - 1.0) / 4.0, 0.0).sum(axis=1)
+    jag_avg = np.divide(jag_sum, jag_count, out=np.zeros(n), where=has_jag)
 
-    client = chromadb.PersistentClient(path=args.persist_dir)
+    score = np.where(has_liking, (liking / 10.0) * 0.6, 0.0) + np.where(has_jag, jag_avg * 0.4, 0.0)
+    weights_sum = 0.6 * has_liking + 0.4 * has_jag
+    return np.divide(score, weights_sum, out=np.zeros(n), where=weights_sum > 0)
+
+@lru_cache(maxsize=None)
+def build_ctx(persist_dir: str):
+    """Open the collection and load its embedding function once per process.
+
+    Returns the collection and an ``embed(text)`` that memoizes query embeddings,
+    so repeated queries in --serve mode skip the encoder forward pass.
+    """
+    client = chromadb.PersistentClient(path=persist_dir)
     ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-    coll = client.get_or_create_collection("coffee_chunks", embedding_function=ef)
 
+    @lru_cache(maxsize=4096)
+    def _embed(key: str):
+        return ef([key])
+
+    def embed(text: str):
+        # The tokenizer splits on whitespace, so texts differing only in spacing
+        # embed identically and can share a cache entry.
+        return _embed(" ".join(text.split()))
+
+    return client.get_or_create_collection("coffee_chunks", embedding_function=ef), embed
+
+def run_query(coll, embed, q_text: str, args):
+    """Retrieve, optionally rerank, and rank the top-k results for one query text."""
     # Fetch more results if reranking is enabled
     n_fetch = args.k * args.retrieval_multiplier if args.use_reranking else args.k
     
+    # Embed with the already-loaded model and hand Chroma the vector, so the
+    # query skips its embedding-function dispatch and input validation.
     res = coll.query(
-        query_texts=[q_text],
+        query_embeddings=embed(q_text),
         n_results=n_fetch,
         include=["metadatas", "documents", "distances"] 
     )
@@ -151,36 +194,36 @@ def main():
     ids = res["ids"][0]
     dists = res["distances"][0]
 
-    # Build candidates with combined scores
+    # Build candidates, then score them for reranking in one array pass
     candidates = []
     for doc, meta, id_, dist in zip(docs, metas, ids, dists):
-        brewing = extract_brewing(meta)
-        evaluation = extract_evaluation(meta)
-        
-        # Compute combined score if reranking
-        combined_score = None
-        if args.use_reranking:
-            similarity_score = 1.0 / (1.0 + float(dist))
-            eval_score = compute_evaluation_score(evaluation)
-            evaluation_weight = 1.0 - args.similarity_weight
-            combined_score = (args.similarity_weight * similarity_score) + (evaluation_weight * eval_score)
-        
         candidates.append({
             "id": id_,
             "distance": float(dist),
             "bean_text": doc,
-            "brewing": brewing,
-            "evaluation": evaluation,
-            "combined_score": combined_score,
+            "brewing": extract_brewing(meta),
+            "evaluation": extract_evaluation(meta),
+            "combined_score": None,
         })
+
+    if args.use_reranking and candidates:
+        similarity_scores = 1.0 / (1.0 + np.asarray(dists, dtype=float))
+        eval_scores = evaluation_scores([c["evaluation"] for c in candidates])
+        evaluation_weight = 1.0 - args.similarity_weight
+        combined = (args.similarity_weight * similarity_scores) + (evaluation_weight * eval_scores)
+        for candidate, combined_score in zip(candidates, combined.tolist()):
+            candidate["combined_score"] = combined_score
     
-    # Rerank if enabled
+    # Rerank if enabled: only the top k are kept, so select them in O(n log k)
+    # (ties keep retrieval order, as with a stable descending sort)
     if args.use_reranking:
-        candidates.sort(key=lambda x: x["combined_score"], reverse=True)
+        top = heapq.nlargest(args.k, candidates, key=lambda x: x["combined_score"])
+    else:
+        top = candidates[:args.k]
     
     # Take top-k with final ranks
     results = []
-    for rank, candidate in enumerate(candidates[:args.k], 1):
+    for rank, candidate in enumerate(top, 1):
         result = {
             "rank": rank,
             "id": candidate["id"],
@@ -191,8 +234,10 @@ def main():
             "combined_score": candidate["combined_score"],
         }
         results.append(result)
+    return results
 
-    if args.json:
+def print_results(q_text: str, results, as_json: bool):
+    if as_json:
         print(json.dumps({"query": q_text, "results": results}, ensure_ascii=False, indent=2))
     else:
         for r in results:
@@ -205,5 +250,63 @@ def main():
             print("evaluation:", json.dumps(r["evaluation"], ensure_ascii=False))
             print("---")
 
+def serve(args):
+    """Answer one query per stdin line with the model and collection kept loaded.
+
+    A line starting with "{" is read as a bean/record JSON object; anything else
+    is free text.
+    """
+    coll, embed = build_ctx(args.persist_dir)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            q_text = bean_text_from_obj(json.loads(line)) if line.startswith("{") else line
+        except json.JSONDecodeError as exc:
+            print(f"invalid JSON query: {exc}", file=sys.stderr)
+            continue
+        print_results(q_text, run_query(coll, embed, q_text, args), args.json)
+        sys.stdout.flush()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--persist-dir', required=True)
+    ap.add_argument('--q', help="free-text query")
+    ap.add_argument('--bean-json', help="path to JSON with a 'bean' object (or full record)")
+    ap.add_argument('--bean-inline', help="inline JSON string with a 'bean' object (or full record)")
+    ap.add_argument('--k', type=int, default=5)
+    ap.add_argument('--json', action='store_true', help="output JSON")
+    ap.add_argument('--serve', action='store_true',
+                    help="keep the model loaded and answer one query per stdin line (free text or bean JSON)")
+    
+    # Reranking parameters
+    ap.add_argument('--use-reranking', action='store_true', default=True, help="enable evaluation-based reranking")
+    ap.add_argument('--no-reranking', dest='use_reranking', action='store_false', help="disable reranking")
+    ap.add_argument('--similarity-weight', type=float, default=0.7, help="weight for similarity (0-1), default 0.7")
+    ap.add_argument('--retrieval-multiplier', type=int, default=3, help="fetch k × multiplier results before reranking")
+    
+    args = ap.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    # Build query text from structured bean or free text
+    if args.bean_json or args.bean_inline:
+        if args.bean_json:
+            with open(args.bean_json, "r", encoding="utf-8") as f:
+                bean_obj = json.load(f)
+        else:
+            bean_obj = json.loads(args.bean_inline)
+        q_text = bean_text_from_obj(bean_obj)
+    elif args.q:
+        q_text = args.q
+    else:
+        raise SystemExit("Provide --bean-json or --bean-inline or --q (or --serve)")
+
+    coll, embed = build_ctx(args.persist_dir)
+    print_results(q_text, run_query(coll, embed, q_text, args), args.json)
+
 if __name__ == "__main__":
     main()
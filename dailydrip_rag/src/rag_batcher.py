@@ -0,0 +1,59 @@
+"""Micro-batching of concurrent requests that can share one backend call."""
+import asyncio
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+
+class RagBatcher:
+    """
+    Collect requests that arrive within ``window_seconds`` of each other under the
+    same group key and answer them with one ``run_batch(group, items)`` call.
+
+    ``run_batch`` is synchronous (Chroma and the encoder block), so it runs in a
+    worker thread and must return one result per item, in order. A group is
+    flushed early once it holds ``max_batch`` items.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[Hashable, List[Any]], List[Any]],
+        window_seconds: float = 0.005,
+        max_batch: int = 16,
+    ):
+        self.run_batch = run_batch
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._pending: Dict[Tuple[int, Hashable], List[Tuple[Any, asyncio.Future]]] = {}
+
+    async def submit(self, group: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Futures belong to one event loop, so pending batches never span loops.
+        key = (id(loop), group)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = []
+            loop.call_later(self.window_seconds, self._flush, key, batch)
+        batch.append((item, future))
+        if len(batch) >= self.max_batch:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key: Tuple[int, Hashable], batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        # The window timer may fire after a size-triggered flush already took it.
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        asyncio.ensure_future(self._run(key[1], batch))
+
+    async def _run(self, group: Hashable, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            results = await asyncio.to_thread(self.run_batch, group, items)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -1,19 +1,40 @@
+import asyncio
 import os
+import threading
+from collections import OrderedDict
 from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, TypedDict
 
 import chromadb
+import numpy as np
+import orjson
 from chromadb.utils import embedding_functions
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel, Field
 
-from .ingest import ingest_records, iter_json_any
+from .ingest import (
+    EVAL_SCORE_KEY, HNSW_METADATA, PAYLOAD_KEY, ingest_records, iter_json_any, meta_sections,
+)
+from .ingest import compute_evaluation_score as _compute_evaluation_score
+from .query_cache import QueryCache, make_key
+from .rag_batcher import RagBatcher
 
 DEFAULT_COLLECTION = "coffee_chunks"
 DEFAULT_MODEL = "all-MiniLM-L6-v2"
 DEFAULT_PERSIST_DIR = Path(__file__).resolve().parent.parent / "indexes" / "chroma"
 DEFAULT_DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "raw" / "coffee_brew_logs_sample.jsonl"
+# Pre-quantized int8 export shipped with all-MiniLM-L6-v2 for AVX-512 VNNI CPUs.
+DEFAULT_ONNX_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+# Identical /rag requests in a burst (UI retries, agent refinement loops) are served
+# from here; a user's /feedback write drops that user's cached results.
+_query_cache = QueryCache(
+    max_size=int(os.getenv("RAG_QUERY_CACHE_SIZE", "2000")),
+    ttl_seconds=float(os.getenv("RAG_QUERY_CACHE_TTL", "300")),
+)
 
 
 class RagQuery(BaseModel):
@@ -64,30 +85,133 @@ class RagReference(BaseModel):
     )
 
 
+class RagReferenceDict(TypedDict):
+    """A RagReference as the plain dict the query path builds and /rag serializes."""
+
+    rank: int
+    id: str
+    distance: float
+    bean_text: str
+    brewing: Dict[str, Any]
+    evaluation: Optional[Dict[str, Any]]
+    combined_score: Optional[float]
+
+
 class RagResponse(BaseModel):
     query: str
     results: List[RagReference]
 
 
-@lru_cache(maxsize=1)
+class RagQueryParams(NamedTuple):
+    """The per-request inputs of one retrieval inside a batched Chroma query."""
+
+    query_text: str
+    k: int
+    use_evaluation_reranking: bool
+    similarity_weight: float
+    retrieval_multiplier: int
+
+
 def _get_client(persist_dir: str):
-    if not persist_dir:
-        persist_dir = str(DEFAULT_PERSIST_DIR)
+    # Keyed by pid: a worker forked after startup must open its own SQLite
+    # connections rather than reuse the parent's client (and its cached collection).
+    return _get_process_client(os.getpid(), persist_dir or str(DEFAULT_PERSIST_DIR))
+
+@lru_cache(maxsize=4)
+def _get_process_client(pid: int, persist_dir: str):
     path = Path(persist_dir)
     if not path.exists():
          path.mkdir(parents=True, exist_ok=True)
 
     return chromadb.PersistentClient(path=str(path))
 
+def _web_concurrency() -> int:
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
 @lru_cache(maxsize=1)
 def _get_embedding_function():
+    """
+    Build the query embedding function once per process.
+
+    RAG_EMBED_BACKEND=onnx runs the model through ONNX Runtime with an int8
+    export (RAG_ONNX_FILE) instead of FP32 PyTorch; it needs the
+    ``sentence-transformers[onnx]`` extra.
+    """
+    kwargs: Dict[str, Any] = {}
+    if os.getenv("RAG_EMBED_BACKEND", "torch").lower() == "onnx":
+        import onnxruntime as ort
+
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Leave half the cores to the event loop and Chroma's HNSW search, split
+        # across worker processes so they do not oversubscribe the CPU.
+        session_options.intra_op_num_threads = max(1, (os.cpu_count() or 2) // (2 * _web_concurrency()))
+        session_options.inter_op_num_threads = 1
+        kwargs = {
+            "backend": "onnx",
+            "model_kwargs": {
+                "file_name": os.getenv("RAG_ONNX_FILE", DEFAULT_ONNX_FILE),
+                "provider": "CPUExecutionProvider",
+                "session_options": session_options,
+            },
+        }
     return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=DEFAULT_MODEL
+        model_name=DEFAULT_MODEL, **kwargs
     )
 
+# Query embeddings by canonical text, most recently used last. Unlike /rag results
+# they do not depend on the index, so writes and /cache_clear leave them alone.
+_embedding_cache: "OrderedDict[str, Any]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+_EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_EMBED_CACHE_SIZE", "1024"))
+
+
+def _embed_queries(texts: List[str]) -> List[Any]:
+    """
+    Embed query texts, encoding only those not seen recently, in one call.
+
+    The MiniLM tokenizer is uncased and splits on whitespace, so the canonical
+    (lower-cased, whitespace-collapsed) text embeds exactly like the original.
+    """
+    keys = [" ".join(text.lower().split()) for text in texts]
+    with _embedding_cache_lock:
+        found = {}
+        for key in keys:
+            if key in _embedding_cache:
+                _embedding_cache.move_to_end(key)
+                found[key] = _embedding_cache[key]
+    missing = [key for key in dict.fromkeys(keys) if key not in found]
+    if missing:
+        found.update(zip(missing, _get_embedding_function()(missing)))
+        if _EMBEDDING_CACHE_SIZE > 0:
+            with _embedding_cache_lock:
+                for key in missing:
+                    _embedding_cache[key] = found[key]
+                while len(_embedding_cache) > _EMBEDDING_CACHE_SIZE:
+                    _embedding_cache.popitem(last=False)
+    return [found[key] for key in keys]
+
+
+@lru_cache(maxsize=4)
 def _get_collection(client):
-    embedding = _get_embedding_function()
-    return client.get_or_create_collection(DEFAULT_COLLECTION, embedding_function=embedding)
+    # Clients are cached per persist dir, so the collection handle (and the
+    # get_or_create round-trip behind it) is reused across requests too.
+    collection = client.get_or_create_collection(
+        DEFAULT_COLLECTION, embedding_function=_get_embedding_function(), metadata=HNSW_METADATA
+    )
+    _apply_search_ef(collection)
+    return collection
+
+
+def _apply_search_ef(collection) -> None:
+    # get_or_create ignores metadata for an existing collection, so one created
+    # before the wider beam gets it here. ef_search is a query-time setting and
+    # can be changed in place; construction_ef needs a rebuild.
+    config = getattr(collection, "configuration", None)
+    hnsw = config.get("hnsw") if isinstance(config, dict) else None
+    search_ef = HNSW_METADATA["hnsw:search_ef"]
+    if isinstance(hnsw, dict) and hnsw.get("ef_search", search_ef) < search_ef:
+        collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
 
 def _populate_default_data(client):
     """
@@ -99,62 +223,46 @@ def _populate_default_data(client):
     # Load default data
     default_data_path = os.getenv("DEFAULT_DATA_PATH", str(DEFAULT_DATA_PATH))
     if os.path.exists(default_data_path):
-        records = list(iter_json_any(default_data_path))
-        # Important: Mark default records as public (user_id=None)
-        # We always upsert to ensure metadata (like access="public") is correct
-        for r in records:
-            r["access"] = "public"
-            # Ensure user_id is not set for default records
-            if "user_id" in r:
-                del r["user_id"]
-        ingest_records(records, collection)
-        print(f"Ingested/Updated {len(records)} default public records.")
+        # Important: Mark default records as public (user_id=None), and ensure
+        # user_id is not set for default records
+        records = [
+            {k: v for k, v in r.items() if k != "user_id"} | {"access": "public"}
+            for r in iter_json_any(default_data_path)
+        ]
+        # Records whose stored text and metadata (like access="public") already
+        # match are skipped, so restarts do not re-embed the whole default set.
+        updated = ingest_records(records, collection, skip_unchanged=True)
+        print(f"Ingested/Updated {updated} of {len(records)} default public records.")
+        # Extra records beyond the defaults are user uploads that may carry
+        # evaluations, so only a defaults-only collection can drop the flag.
+        has_evaluation = any(r.get("evaluation") for r in records) or collection.count() > len(records)
+        _set_has_evaluation(collection, has_evaluation)
     else:
         print(f"Warning: Default data not found at {default_data_path}")
 
 
-def _compute_evaluation_score(evaluation: Optional[Dict[str, Any]]) -> float:
+def _has_evaluation(collection) -> bool:
     """
-    Compute a normalized evaluation score from 0.0 to 1.0.
+    Whether any stored record may carry evaluation metadata. Collections that
+    predate the flag are assumed to.
     """
-    if not evaluation:
-        return 0.0
-    
-    score = 0.0
-    weights_sum = 0.0
-    
-    # Liking score (0-10 scale) → 60% weight
-    liking = evaluation.get("liking")
-    if liking is not None:
-        try:
-            normalized_liking = float(liking) / 10.0  # normalize to 0-1
-            score += normalized_liking * 0.6
-            weights_sum += 0.6
-        except (ValueError, TypeError):
-            pass
-    
-    # JAG metrics (1-5 scale) → 40% weight (split equally)
-    jag = evaluation.get("jag", {})
-    if isinstance(jag, dict):
-        jag_keys = ["flavour_intensity", "acidity", "mouthfeel", "sweetness", "purchase_intent"]
-        jag_values = []
-        for key in jag_keys:
-            val = jag.get(key)
-            if val is not None:
-                try:
-                    normalized_val = (float(val) - 1.0) / 4.0  # normalize 1-5 to 0-1
-                    jag_values.append(normalized_val)
-                except (ValueError, TypeError):
-                    pass
-        
-        if jag_values:
-            jag_avg = sum(jag_values) / len(jag_values)
-            score += jag_avg * 0.4
-            weights_sum += 0.4
-    
-    if weights_sum > 0:
-        return score / weights_sum
-    return 0.0
+    return (getattr(collection, "metadata", None) or {}).get("has_evaluation", True)
+
+
+def _set_has_evaluation(collection, value: bool) -> None:
+    metadata = collection.metadata or {}
+    if metadata.get("has_evaluation") != value:
+        collection.modify(metadata={**metadata, "has_evaluation": value})
+
+
+def _warm_up(collection) -> None:
+    """
+    Run one throwaway embedding and search so the model load, first-call graph
+    setup, and HNSW index load happen at startup instead of on the first /rag.
+    """
+    _get_embedding_function()(["warmup"])
+    if collection.count():
+        collection.query(query_texts=["warmup"], n_results=1, where={"access": "public"})
 
 
 def _build_query_text(payload: RagQuery) -> str:
@@ -172,15 +280,38 @@ def _build_query_text(payload: RagQuery) -> str:
     return _bean_text_from_obj(query_source)
 
 
+# Bean fields used for query text, in output order; matches the agent's columns.
+BEAN_TEXT_COLUMNS = (
+    "bean.name",
+    "bean.origin",
+    "bean.process",
+    "bean.variety",
+    "bean.region",
+    "bean.roast_level",
+    "bean.roasted_days",
+    "bean.altitude",
+    "bean.flavor_notes",
+)
+# (column, field within the "bean" section) pairs for the nested-record fast path
+_BEAN_TEXT_FIELDS = tuple((column, column.split(".", 1)[1]) for column in BEAN_TEXT_COLUMNS)
+
+
 # Re-implementing helper for safety
 def _flatten_dict(data: Dict[str, Any], parent: str = "", sep: str = ".") -> Dict[str, Any]:
-    flattened = {}
-    for key, value in data.items():
-        new_key = f"{parent}{sep}{key}" if parent else key
-        if isinstance(value, dict):
-            flattened.update(_flatten_dict(value, new_key, sep=sep))
-        else:
+    # Iterative walk over (prefix, items iterator) pairs: no recursive calls or
+    # intermediate dicts, and keys keep their depth-first order.
+    flattened: Dict[str, Any] = {}
+    stack = [(parent, iter(data.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for key, value in items:
+            new_key = f"{prefix}{sep}{key}" if prefix else key
+            if isinstance(value, dict):
+                stack.append((new_key, iter(value.items())))
+                break
             flattened[new_key] = value
+        else:
+            stack.pop()
     return flattened
 
 def _list_to_str(value: Any) -> Any:
@@ -188,28 +319,118 @@ def _list_to_str(value: Any) -> Any:
 
 def _bean_text_from_obj(obj: Dict[str, Any]) -> str:
     # Simplified bean text constructor matching the logic of the agent
+    bean = obj.get("bean")
+    if isinstance(bean, dict) and not any(isinstance(k, str) and k.startswith("bean.") for k in obj):
+        # Usual request shape: read the bean fields directly instead of flattening
+        # the whole record. Nested dicts are skipped, as flattening would rename them.
+        text = " | ".join(
+            f"{column}: {val}"
+            for column, field in _BEAN_TEXT_FIELDS
+            if (val := _list_to_str(bean.get(field))) is not None and val != "" and not isinstance(val, dict)
+        )
+        if text:
+            return text
     flat = _flatten_dict(obj)
-    parts = []
-    columns = [
-        "bean.name",
-        "bean.origin",
-        "bean.process",
-        "bean.variety",
-        "bean.region",
-        "bean.roast_level",
-        "bean.roasted_days",
-        "bean.altitude",
-        "bean.flavor_notes",
-    ]
-    for key in columns:
-        val = _list_to_str(flat.get(key))
-        if val is not None and val != "":
-            parts.append(f"{key}: {val}")
+    text = " | ".join(
+        f"{key}: {val}"
+        for key in BEAN_TEXT_COLUMNS
+        if (val := _list_to_str(flat.get(key))) is not None and val != ""
+    )
     # If no specific columns matched (e.g. flat structure), just dump all
-    if not parts:
-        for k, v in flat.items():
-            parts.append(f"{k}: {v}")
-    return " | ".join(parts)
+    return text or " | ".join(f"{k}: {v}" for k, v in flat.items())
+
+
+def _where_for_user(user_id: str) -> Dict[str, Any]:
+    # ChromaDB $or filter: (access='public') OR (user_id=user_id)
+    return {
+        "$or": [
+            {"access": "public"},
+            {"user_id": user_id}
+        ]
+    }
+
+
+# Chroma stores flat metadata; these rebuild the brewing/evaluation sections
+# minimally by stripping the key prefix.
+def _split_meta(meta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Return the brewing and evaluation sections of a stored record's metadata.
+
+    Records ingested with a JSON payload decode it directly; older records route
+    their flat keys to the two sections in one pass.
+    """
+    payload = meta.get(PAYLOAD_KEY)
+    if payload is not None:
+        sections = orjson.loads(payload)
+        return sections["brewing"], sections["evaluation"]
+    brewing: Dict[str, Any] = {}
+    evaluation: Dict[str, Any] = {}
+    for key, value in meta.items():
+        if key.startswith("brewing."):
+            brewing[key[8:]] = value
+        elif key.startswith("evaluation."):
+            evaluation[key[11:]] = value
+    return brewing, evaluation
+
+
+def _stored_evaluation_score(meta: Dict[str, Any]) -> float:
+    # Scores are precomputed at ingest; records stored before that are scored here.
+    score = meta.get(EVAL_SCORE_KEY)
+    if score is None:
+        return _compute_evaluation_score(_split_meta(meta)[1])
+    return score
+
+
+def _rank_candidates(
+    docs: List[str],
+    metas: List[Dict[str, Any]],
+    ids: List[Any],
+    distances: List[float],
+    k: int,
+    use_evaluation_reranking: bool = True,
+    similarity_weight: float = 0.7,
+    has_evaluation: bool = True,
+) -> List[RagReferenceDict]:
+    """
+    Rerank one query's retrieved candidates and build references for the top k.
+
+    Without evaluations every evaluation score is 0, so the combined score is the
+    weighted similarity alone.
+    """
+    n = len(docs)
+    if use_evaluation_reranking and n:
+        # Score every candidate in one array expression, then materialize only the
+        # k winners. A stable argsort keeps retrieval order among equal scores.
+        sims = 1.0 / (1.0 + np.asarray(distances, dtype=float))
+        combined = similarity_weight * sims
+        if has_evaluation:
+            eval_scores = np.fromiter((_stored_evaluation_score(meta) for meta in metas), dtype=float, count=n)
+            combined += (1.0 - similarity_weight) * eval_scores
+        order = np.argsort(-combined, kind="stable")[:k].tolist()
+        combined_scores = combined.tolist()
+    else:
+        order = list(range(min(k, n)))
+        combined_scores = [None] * n
+    sections = {i: _split_meta(metas[i]) for i in order}
+
+    # Plain dicts in RagReference field order: they go straight to orjson, so
+    # model construction and validation would be pure overhead.
+    return [
+        {
+            "rank": rank,
+            "id": str(ids[i]),
+            "distance": float(distances[i]),
+            "bean_text": docs[i],
+            "brewing": sections[i][0],
+            "evaluation": sections[i][1],
+            "combined_score": combined_scores[i],
+        }
+        for rank, i in enumerate(order, start=1)
+    ]
+
+
+# Chroma returns every included field (and ids), one row per query embedding.
+_result_fields = itemgetter("documents", "metadatas", "ids", "distances")
 
 
 def _run_query(
@@ -220,91 +441,152 @@ def _run_query(
     use_evaluation_reranking: bool = True,
     similarity_weight: float = 0.7,
     retrieval_multiplier: int = 3,
-) -> List[RagReference]:
+) -> List[RagReferenceDict]:
     """
     Query with metadata filtering: (access='public') OR (user_id=user_id)
     """
-    n_fetch = k * retrieval_multiplier if use_evaluation_reranking else k
-    
-    # ChromaDB $or filter
-    where_filter = {
-        "$or": [
-            {"access": "public"},
-            {"user_id": user_id}
-        ]
-    }
-    
+    has_evaluation = _has_evaluation(collection)
+    # With no evaluations to rerank by, the nearest k already are the top k.
+    n_fetch = k * retrieval_multiplier if use_evaluation_reranking and has_evaluation else k
+
     response = collection.query(
-        query_texts=[query_text],
+        query_embeddings=_embed_queries([query_text]),
         n_results=n_fetch,
-        where=where_filter,
+        where=_where_for_user(user_id),
         include=["metadatas", "documents", "distances"],
     )
 
-    docs = response.get("documents", [[]])[0]
-    metas = response.get("metadatas", [[]])[0]
-    ids = response.get("ids", [[]])[0]
-    distances = response.get("distances", [[]])[0]
-
-    # Reconstruct brewing/evaluation extraction logic
-    # (Simplified for brevity, assuming standard keys)
-    def _extract_brewing(meta):
-        # ... Reuse logic or simplify ...
-        # For simplicity, we assume meta contains flat keys. 
-        # Ideally we validly reconstruct. 
-        # Let's assume the previous `extract_brewing` logic was available or we just return meta['brewing'] if it was stored as JSON?
-        # No, Chroma stores flat metadata. We need to reconstruct.
-        # Check if we have the helper utils from previous code or imported.
-        # I will include minimal reconstruction logic here to keep it self-contained.
-        return {k.replace("brewing.", ""): v for k, v in meta.items() if k.startswith("brewing.")}
-
-    def _extract_evaluation(meta):
-        return {k.replace("evaluation.", ""): v for k, v in meta.items() if k.startswith("evaluation.")}
-
-    candidates = []
-    for doc, meta, record_id, dist in zip(docs, metas, ids, distances):
-        # Try to parse brewing/evaluation from meta
-        # Note: This is an approximation. Real logic uses strict reconstruction.
-        # If possible, we should import `extract_brewing` from `.utils` if it existed.
-        # Let's trust that minimal reconstruction is enough for RAG retrieval context.
-        brewing = _extract_brewing(meta)
-        evaluation = _extract_evaluation(meta)
-        
-        combined_score = None
-        if use_evaluation_reranking:
-            similarity_score = 1.0 / (1.0 + float(dist)) if dist is not None else 0
-            eval_score = _compute_evaluation_score(evaluation)
-            evaluation_weight = 1.0 - similarity_weight
-            combined_score = (similarity_weight * similarity_score) + (evaluation_weight * eval_score)
-        
-        candidates.append({
-            "id": str(record_id),
-            "distance": float(dist),
-            "bean_text": doc,
-            "brewing": brewing,
-            "evaluation": evaluation,
-            "combined_score": combined_score,
-        })
-    
-    if use_evaluation_reranking:
-        candidates.sort(key=lambda x: x["combined_score"] or 0, reverse=True)
-    
-    results: List[RagReference] = []
-    for rank, candidate in enumerate(candidates[:k], start=1):
+    docs, metas, ids, distances = _result_fields(response)
+    return _rank_candidates(
+        docs[0],
+        metas[0],
+        ids[0],
+        distances[0],
+        k,
+        use_evaluation_reranking=use_evaluation_reranking,
+        similarity_weight=similarity_weight,
+        has_evaluation=has_evaluation,
+    )
+
+
+def _run_query_batch(
+    collection,
+    user_id: str,
+    requests: List[RagQueryParams],
+    embeddings: Optional[List[Any]] = None,
+) -> List[List[RagReferenceDict]]:
+    """
+    Answer several queries for one user with a single ``collection.query`` call.
+
+    Every query shares the user's filter and fetches the largest ``n_fetch`` in the
+    batch; Chroma returns neighbours nearest-first, so each query's own top
+    ``n_fetch`` is a prefix of its row. ``embeddings`` may carry the queries'
+    vectors when the caller already encoded them.
+    """
+    has_evaluation = _has_evaluation(collection)
+    n_fetches = [
+        r.k * r.retrieval_multiplier if r.use_evaluation_reranking and has_evaluation else r.k
+        for r in requests
+    ]
+    # Embed with the process's model and hand Chroma the vectors, so the query
+    # skips its embedding-function dispatch. It is the collection's own function,
+    # so distances are unchanged.
+    if embeddings is None:
+        embeddings = _embed_queries([r.query_text for r in requests])
+    response = collection.query(
+        query_embeddings=embeddings,
+        n_results=max(n_fetches),
+        where=_where_for_user(user_id),
+        include=["metadatas", "documents", "distances"],
+    )
+    docs, metas, ids, distances = _result_fields(response)
+
+    results = []
+    for i, (r, n_fetch) in enumerate(zip(requests, n_fetches)):
         results.append(
-            RagReference(
-                rank=rank,
-                id=candidate["id"],
-                distance=candidate["distance"],
-                bean_text=candidate["bean_text"],
-                brewing=candidate["brewing"],
-                evaluation=candidate["evaluation"],
-                combined_score=candidate["combined_score"],
+            _rank_candidates(
+                docs[i][:n_fetch] if i < len(docs) else [],
+                metas[i][:n_fetch] if i < len(metas) else [],
+                ids[i][:n_fetch] if i < len(ids) else [],
+                distances[i][:n_fetch] if i < len(distances) else [],
+                r.k,
+                use_evaluation_reranking=r.use_evaluation_reranking,
+                similarity_weight=r.similarity_weight,
+                has_evaluation=has_evaluation,
             )
         )
     return results
 
 
+def _result_cache_key(query_text: str, payload: RagQuery) -> bytes:
+    # The MiniLM tokenizer is uncased and splits on whitespace, so case and
+    # spacing variants of a query embed identically and can share an entry.
+    normalized = " ".join(query_text.lower().split())
+    if payload.use_evaluation_reranking:
+        # The rerank pool is k * retrieval_multiplier, so a smaller k can rank
+        # differently: only identical requests share results.
+        return make_key(
+            normalized,
+            payload.user_id,
+            True,
+            payload.similarity_weight,
+            payload.retrieval_multiplier,
+            payload.k,
+        )
+    # Without reranking results are nearest-first, so a smaller k is a prefix.
+    return make_key(normalized, payload.user_id, False)
+
+
+def _answer_batch(_group: Any, items: List[Tuple[Any, str, RagQueryParams]]) -> List[List[RagReferenceDict]]:
+    """
+    Answer ``(collection, user_id, params)`` requests from any users against one
+    collection: one encoder forward pass embeds every query, then each user's
+    queries share one filtered Chroma call.
+    """
+    collection = items[0][0]
+    embeddings = _embed_queries([params.query_text for _, _, params in items])
+
+    by_user: Dict[str, List[int]] = {}
+    for i, (_, user_id, _) in enumerate(items):
+        by_user.setdefault(user_id, []).append(i)
+    results: List[List[RagReferenceDict]] = [[] for _ in items]
+    for user_id, indices in by_user.items():
+        answers = _run_query_batch(
+            collection,
+            user_id,
+            [items[i][2] for i in indices],
+            embeddings=[embeddings[i] for i in indices],
+        )
+        for i, answer in zip(indices, answers):
+            results[i] = answer
+    return results
+
+
+# /rag requests arriving within RAG_BATCH_WINDOW_MS of each other are embedded in
+# one forward pass and searched with one Chroma call per user; 0 sends every
+# request on its own.
+_batch_window_ms = float(os.getenv("RAG_BATCH_WINDOW_MS", "5"))
+_rag_batcher = (
+    RagBatcher(
+        _answer_batch,
+        window_seconds=_batch_window_ms / 1000.0,
+        max_batch=int(os.getenv("RAG_BATCH_MAX", "16")),
+    )
+    if _batch_window_ms > 0
+    else None
+)
+
+
+def _app_collection(app: FastAPI):
+    # The startup hook resolves the collection once; without it (no lifespan,
+    # as in tests) fall back to the cached per-process lookup.
+    collection = getattr(app.state, "collection", None)
+    if collection is None:
+        persist_dir = os.getenv("RAG_PERSIST_DIR", str(DEFAULT_PERSIST_DIR))
+        collection = _get_collection(_get_client(persist_dir))
+    return collection
+
+
 def create_app() -> FastAPI:
     app = FastAPI(title="DailyDrip RAG Service", version="0.2.0")
 
@@ -313,33 +595,65 @@ def create_app() -> FastAPI:
         persist_dir = os.getenv("RAG_PERSIST_DIR", str(DEFAULT_PERSIST_DIR))
         client = _get_client(persist_dir)
         _populate_default_data(client)
+        app.state.collection = _get_collection(client)
+        _warm_up(app.state.collection)
 
     @app.get("/healthz")
     def health() -> Dict[str, str]:
         return {"status": "ok"}
 
+    # RagResponse documents the schema; the handler returns pre-serialized orjson
+    # bytes so FastAPI skips re-validating and re-encoding every reference.
     @app.post("/rag", response_model=RagResponse)
-    def rag(payload: RagQuery) -> RagResponse:
-        persist_dir = os.getenv("RAG_PERSIST_DIR", str(DEFAULT_PERSIST_DIR))
-        client = _get_client(persist_dir)
-        collection = _get_collection(client)
-        
+    async def rag(payload: RagQuery, request: Request) -> Response:
         query_text = _build_query_text(payload) # Should use robust builder
         
         # Use simple text conversion if builder invalid
         if not query_text or query_text == "{}":
              query_text = _bean_text_from_obj(payload.bean or {})
 
-        results = _run_query(
-            collection,
-            query_text,
-            payload.user_id,
-            payload.k,
-            use_evaluation_reranking=payload.use_evaluation_reranking,
-            similarity_weight=payload.similarity_weight,
-            retrieval_multiplier=payload.retrieval_multiplier,
+        cache_key = _result_cache_key(query_text, payload)
+        cached = _query_cache.get(cache_key)
+        # An entry fetched for at least this k (or that exhausted the matches)
+        # answers the request with a prefix of its results.
+        if cached is not None and (cached[0] >= payload.k or len(cached[1]) < cached[0]):
+            results = cached[1][:payload.k]
+            cache_status = "hit"
+        else:
+            cache_status = "miss"
+            params = RagQueryParams(
+                query_text,
+                payload.k,
+                payload.use_evaluation_reranking,
+                payload.similarity_weight,
+                payload.retrieval_multiplier,
+            )
+            collection = _app_collection(request.app)
+            if _rag_batcher is not None:
+                # Concurrent requests share one encoder pass (and, per user, one
+                # query). Collections are unhashable, so batches key on their id.
+                item = (collection, payload.user_id, params)
+                results = await _rag_batcher.submit(id(collection), item)
+            else:
+                batch = await asyncio.to_thread(_answer_batch, None, [(collection, payload.user_id, params)])
+                results = batch[0]
+            _query_cache.put(cache_key, payload.user_id, (payload.k, results))
+        return Response(
+            content=orjson.dumps({"query": query_text, "results": results}),
+            media_type="application/json",
+            headers={"X-Cache": cache_status},
         )
-        return RagResponse(query=query_text, results=results)
+
+    @app.get("/cache_stats")
+    def cache_stats() -> Dict[str, int]:
+        return _query_cache.stats()
+
+    @app.post("/cache_clear")
+    def cache_clear() -> Dict[str, int]:
+        # For index rebuilds, which change results without going through /feedback.
+        cleared = _query_cache.stats()["size"]
+        _query_cache.clear()
+        return {"cleared": cleared}
 
     class FeedbackPayload(BaseModel):
         user_id: str
@@ -348,22 +662,28 @@ def create_app() -> FastAPI:
         meta: Dict[str, Any]
 
     @app.post("/feedback", status_code=201)
-    def feedback(payload: FeedbackPayload) -> Dict[str, str]:
-        persist_dir = os.getenv("RAG_PERSIST_DIR", str(DEFAULT_PERSIST_DIR))
-        client = _get_client(persist_dir)
-        collection = _get_collection(client)
+    def feedback(payload: FeedbackPayload, request: Request) -> Dict[str, str]:
+        collection = _app_collection(request.app)
         
         # Enforce user ownership in metadata
         meta = payload.meta.copy()
         meta["user_id"] = payload.user_id
         # Remove 'access' if present to default to private, or set explicitly
         meta["access"] = "private" 
+        # Chroma merges metadata on upsert, so rebuild the payload and score the
+        # way ingest_records does; otherwise an ingested record's stale ones win.
+        sections = meta_sections(meta)
+        meta[PAYLOAD_KEY] = orjson.dumps(sections).decode("utf-8")
+        meta[EVAL_SCORE_KEY] = _compute_evaluation_score(sections["evaluation"])
         
         collection.upsert(
             ids=[payload.id],
             documents=[payload.text],
             metadatas=[meta]
         )
+        if any(key.startswith("evaluation.") for key in meta):
+            _set_has_evaluation(collection, True)
+        _query_cache.invalidate_user(payload.user_id)
         return {"status": "ok", "id": payload.id}
 
 
@@ -382,6 +702,11 @@ def main() -> None:
         host="0.0.0.0",
         port=int(os.getenv("PORT", "8000")),
         reload=False,
+        # Query caches and batches live in each process, and every worker opens
+        # the same Chroma directory, so more than one worker is opt-in.
+        workers=_web_concurrency(),
+        loop="uvloop",
+        http="httptools",
     )
 
 
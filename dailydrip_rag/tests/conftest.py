@@ -12,8 +12,23 @@ def mock_sentence_transformer_embedding():
     The FastAPI service bootstraps a SentenceTransformer embedding to talk to ChromaDB.
     We stub the embedding function globally so unit/integration tests don't need the real package.
     """
+    embedding_function = MagicMock(
+        name="embedding_function", side_effect=lambda texts: [[0.0, 0.0, 0.0] for _ in texts]
+    )
     with patch(
         "src.service.embedding_functions.SentenceTransformerEmbeddingFunction",
-        return_value=MagicMock(name="embedding_function"),
+        return_value=embedding_function,
     ) as mock:
         yield mock
+
+
+@pytest.fixture(autouse=True)
+def clear_query_cache():
+    """Keep cached /rag results and embeddings from leaking between tests with different mocks."""
+    from src.service import _embedding_cache, _query_cache
+
+    _query_cache.clear()
+    _embedding_cache.clear()
+    yield
+    _query_cache.clear()
+    _embedding_cache.clear()
@@ -1,6 +1,12 @@
 """Unit tests for ingest module."""
-import pandas as pd
-from src.ingest import flatten, list_to_str, pours_to_str, bean_text, make_record
+import hashlib
+import json
+
+import pytest
+from src.ingest import (
+    EVAL_SCORE_KEY, PAYLOAD_KEY, flatten, list_to_str, pours_to_str, bean_text, make_record, iter_csv,
+    ingest_records, sanitize_meta,
+)
 
 
 class TestIngestFlatten:
@@ -88,12 +94,13 @@ class TestBeanText:
         """Test bean text skips NaN values."""
         flat = {
             "bean.name": "Kenya AA",
-            "bean.altitude": pd.NA,
+            "bean.altitude": float("nan"),
             "bean.roast_level": "Dark"
         }
         result = bean_text(flat)
         assert "Kenya AA" in result
         assert "Dark" in result
+        assert "altitude" not in result
 
 
 class TestMakeRecord:
@@ -152,6 +159,14 @@ class TestMakeRecord:
         result = make_record(obj)
         assert "id" in result
         assert "uuid-123" in result["id"]
+
+    def test_make_record_id_is_stable(self):
+        """Test the id suffix is derived deterministically from the text."""
+        obj = {"id": "stable", "bean": {"name": "Test Bean"}}
+        result = make_record(obj)
+        digest = hashlib.blake2b(result["text"].encode("utf-8"), digest_size=8).hexdigest()
+        assert result["id"] == f"stable-{digest[-6:]}"
+        assert make_record(obj)["id"] == result["id"]
     
     def test_make_record_complex(self):
         """Test creating record with complex data."""
@@ -199,3 +214,131 @@ class TestMakeRecord:
         assert result["meta"]["brewing.brewer"] == "V60"
         assert "evaluation.liking" in result["meta"]
         assert result["meta"]["evaluation.liking"] == 9.0
+
+
+class TestWriteRecords:
+    """Test the batched JSONL writer."""
+
+    def test_write_records_flushes_in_blocks(self, monkeypatch):
+        """Test every record lands on its own line across block flushes."""
+        import io
+        import json
+        from src import ingest
+        monkeypatch.setattr(ingest, "FLUSH_BYTES", 64)
+        records = [{"id": f"r{i}", "text": "x" * 20} for i in range(10)]
+        out = io.BytesIO()
+        writes = []
+        real_write = out.write
+        monkeypatch.setattr(out, "write", lambda b: writes.append(len(b)) or real_write(b))
+        ingest.write_records(out, records)
+        lines = out.getvalue().decode("utf-8").splitlines()
+        assert [json.loads(line) for line in lines] == records
+        assert 1 < len(writes) < len(records)
+
+
+class TestIterCsv:
+    """Test the streaming CSV reader."""
+
+    def test_iter_csv_coerces_cells(self, tmp_path):
+        """Test numeric, boolean, and missing cells are typed."""
+        path = tmp_path / "rows.csv"
+        path.write_text("bean.name,bean.altitude,Volume,decaf,bean.process\nKenya AA,1800,5.0,False,\n", encoding="utf-8")
+        rows = list(iter_csv(str(path)))
+        assert rows == [{"bean.name": "Kenya AA", "bean.altitude": 1800, "Volume": 5.0, "decaf": False, "bean.process": None}]
+        assert bean_text(rows[0]) == "bean.name: Kenya AA | bean.altitude: 1800"
+
+    def test_iter_csv_short_rows_fill_missing_cells_with_none(self, tmp_path):
+        """Test rows with fewer fields than the header do not abort the ingest."""
+        path = tmp_path / "rows.csv"
+        path.write_text("name,grind,dose\nA,fine,15\nB,15\n", encoding="utf-8")
+        assert list(iter_csv(str(path))) == [
+            {"name": "A", "grind": "fine", "dose": 15},
+            {"name": "B", "grind": 15, "dose": None},
+        ]
+
+    def test_iter_csv_types_each_cell_independently(self, tmp_path):
+        """Test a column mixing numbers and text is typed per cell."""
+        path = tmp_path / "rows.csv"
+        path.write_text("name,grind\nA,12\nB,fine\n", encoding="utf-8")
+        assert [row["grind"] for row in iter_csv(str(path))] == [12, "fine"]
+
+
+class TestSanitizeMeta:
+    """Test ChromaDB metadata sanitization."""
+
+    def test_sanitize_meta_flattens_pours_and_deep_nesting(self):
+        """Test lists of dicts get indexed keys and deep nesting does not recurse."""
+        deep = leaf = {}
+        for _ in range(2000):
+            leaf["n"] = {}
+            leaf = leaf["n"]
+        leaf["v"] = 1
+        meta = {"brewing": {"pours": [{"start": 0}, {"start": 30}]}, "notes": ["a", 2], "deep": deep}
+        result = sanitize_meta(meta)
+        assert result["brewing.pours.0.start"] == 0
+        assert result["brewing.pours.1.start"] == 30
+        assert result["notes"] == "a, 2"
+        assert result["deep" + ".n" * 2000 + ".v"] == 1
+
+
+class TestIngestRecords:
+    """Test upserting records into a collection."""
+
+    class FakeCollection:
+        """Stores upserts and drops None-valued metadata like Chroma."""
+
+        def __init__(self):
+            self.rows = {}
+            self.upserts = []
+
+        def upsert(self, ids, documents, metadatas):
+            self.upserts.append(list(ids))
+            for rid, doc, meta in zip(ids, documents, metadatas):
+                self.rows[rid] = (doc, {k: v for k, v in meta.items() if v is not None})
+
+        def get(self, ids, include):
+            found = [rid for rid in ids if rid in self.rows]
+            return {
+                "ids": found,
+                "documents": [self.rows[rid][0] for rid in found],
+                "metadatas": [self.rows[rid][1] for rid in found],
+            }
+
+    def test_skip_unchanged_only_upserts_new_or_changed(self):
+        """Test unchanged records are not re-upserted."""
+        collection = self.FakeCollection()
+        records = [
+            {"id": "a", "bean": {"name": "Kenya", "altitude": None}, "access": "public"},
+            {"id": "b", "bean": {"name": "Colombia"}, "access": "public"},
+        ]
+        assert ingest_records(records, collection, skip_unchanged=True) == 2
+        assert ingest_records(records, collection, skip_unchanged=True) == 0
+
+        records[1]["access"] = "private"
+        assert ingest_records(records, collection, skip_unchanged=True) == 1
+        assert collection.upserts[-1][0].startswith("b-")
+
+    def test_default_upserts_everything(self):
+        """Test records are upserted unconditionally by default."""
+        collection = self.FakeCollection()
+        records = [{"id": "a", "bean": {"name": "Kenya"}}]
+        ingest_records(records, collection)
+        assert ingest_records(records, collection) == 1
+        assert len(collection.upserts) == 2
+
+    def test_payload_holds_brewing_and_evaluation_sections(self):
+        """Test the stored JSON payload mirrors the flat brewing/evaluation keys."""
+        collection = self.FakeCollection()
+        records = [{
+            "id": "a",
+            "bean": {"name": "Kenya"},
+            "brewing": {"temperature": 92, "grind": None},
+            "evaluation": {"liking": 8, "jag": {"acidity": 4}},
+        }]
+        ingest_records(records, collection)
+        (_, meta), = collection.rows.values()
+        assert json.loads(meta[PAYLOAD_KEY]) == {
+            "brewing": {"temperature": 92},
+            "evaluation": {"liking": 8, "jag.acidity": 4},
+        }
+        assert meta[EVAL_SCORE_KEY] == pytest.approx(0.8)
@@ -64,6 +64,13 @@ def test_iter_json_any_supports_multiple_input_formats(tmp_path):
     assert list(iter_json_any(str(as_concat))) == payload
 
 
+def test_iter_json_any_does_not_repeat_streamed_lines(tmp_path):
+    """A compact first line followed by pretty JSON should yield each object once."""
+    mixed = tmp_path / "records_mixed.json"
+    mixed.write_text(json.dumps({"id": 1}) + "\n" + json.dumps({"id": 2}, indent=2), encoding="utf-8")
+    assert list(iter_json_any(str(mixed))) == [{"id": 1}, {"id": 2}]
+
+
 def test_compute_evaluation_score_partial_metrics():
     """_compute_evaluation_score should blend liking and partial JAG data."""
     evaluation = {
@@ -134,8 +141,8 @@ def test_run_query_with_reranking_emphasizes_scores():
         retrieval_multiplier=2,
     )
 
-    assert [r.id for r in results] == ["bean-1", "bean-2"]
-    assert all(r.combined_score is not None for r in results)
+    assert [r["id"] for r in results] == ["bean-1", "bean-2"]
+    assert all(r["combined_score"] is not None for r in results)
     # ensure collection was asked for more than k results when reranking
     assert collection.queries[0]["n_results"] == 4
 
@@ -160,5 +167,23 @@ def test_run_query_without_reranking_preserves_order():
         retrieval_multiplier=1,
     )
 
-    assert [r.id for r in results] == ["A", "B"]
-    assert all(r.combined_score is None for r in results)
+    assert [r["id"] for r in results] == ["A", "B"]
+    assert all(r["combined_score"] is None for r in results)
+
+
+def test_run_query_skips_rerank_fetch_without_evaluations():
+    """Collections flagged as evaluation-free fetch only k and score by similarity."""
+    response = {
+        "documents": [["doc A", "doc B"]],
+        "metadatas": [[{"brewing.brewer": "Origami"}, {"brewing.brewer": "Flatbed"}]],
+        "ids": [["A", "B"]],
+        "distances": [[0.0, 1.0]],
+    }
+    collection = DummyCollection(response)
+    collection.metadata = {"has_evaluation": False}
+
+    results = _run_query(collection, query_text="berry", user_id="test_user", k=2, similarity_weight=0.5)
+
+    assert collection.queries[0]["n_results"] == 2
+    assert [r["id"] for r in results] == ["A", "B"]
+    assert [r["combined_score"] for r in results] == pytest.approx([0.5, 0.25])
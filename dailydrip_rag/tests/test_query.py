@@ -266,3 +266,26 @@ class TestComputeEvaluationScore:
         }
         score = compute_evaluation_score(evaluation)
         assert score == 0.0
+
+
+class TestEvaluationScores:
+    """Test the batched evaluation_scores function."""
+
+    def test_matches_compute_evaluation_score(self):
+        """Test each array entry equals the per-candidate score."""
+        from src.query import compute_evaluation_score, evaluation_scores
+        evaluations = [
+            None,
+            {"liking": 8.0},
+            {"jag": {"flavour_intensity": 4, "acidity": 3, "mouthfeel": 5}},
+            {"liking": 9.0, "jag": {"flavour_intensity": 5, "acidity": 4, "sweetness": 5}},
+            {"liking": "invalid", "jag": {"flavour_intensity": "bad"}},
+            {"liking": "7", "jag": {"acidity": 2, "sweetness": "oops"}},
+        ]
+        scores = evaluation_scores(evaluations)
+        assert scores.tolist() == [compute_evaluation_score(e) for e in evaluations]
+
+    def test_empty_candidates(self):
+        """Test an empty candidate list yields an empty array."""
+        from src.query import evaluation_scores
+        assert evaluation_scores([]).shape == (0,)
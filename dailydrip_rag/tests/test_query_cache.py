@@ -0,0 +1,59 @@
+"""Unit tests for the query result cache."""
+from unittest.mock import patch
+
+from src.query_cache import QueryCache, make_key
+
+
+class TestQueryCache:
+    """Test TTL, LRU, and per-user invalidation behavior."""
+
+    def test_hit_and_miss_counts(self):
+        """Test a stored value is returned and counted as a hit."""
+        cache = QueryCache(max_size=4, ttl_seconds=60)
+        key = make_key("light fruity", "user-1", 3)
+        assert cache.get(key) is None
+        cache.put(key, "user-1", ["result"])
+        assert cache.get(key) == ["result"]
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_key_depends_on_every_part(self):
+        """Test different parameters never share a key."""
+        assert make_key("q", "user-1", 3) != make_key("q", "user-2", 3)
+        assert make_key("q", "user-1", 3) != make_key("q", "user-1", 4)
+        assert make_key("q", "user-1", 3) == make_key("q", "user-1", 3)
+
+    def test_entries_expire(self):
+        """Test entries older than the TTL are treated as misses."""
+        cache = QueryCache(max_size=4, ttl_seconds=10)
+        with patch("src.query_cache.time.monotonic", return_value=100.0):
+            cache.put(b"k", "user-1", "value")
+        with patch("src.query_cache.time.monotonic", return_value=111.0):
+            assert cache.get(b"k") is None
+        assert cache.stats()["size"] == 0
+
+    def test_least_recently_used_is_evicted(self):
+        """Test the oldest untouched entry is evicted beyond max_size."""
+        cache = QueryCache(max_size=2, ttl_seconds=60)
+        cache.put(b"a", "u", 1)
+        cache.put(b"b", "u", 2)
+        cache.get(b"a")
+        cache.put(b"c", "u", 3)
+        assert cache.get(b"b") is None
+        assert cache.get(b"a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_invalidate_user_only_drops_that_user(self):
+        """Test invalidation leaves other users' entries cached."""
+        cache = QueryCache(max_size=4, ttl_seconds=60)
+        cache.put(b"a", "user-1", 1)
+        cache.put(b"b", "user-2", 2)
+        assert cache.invalidate_user("user-1") == 1
+        assert cache.get(b"a") is None
+        assert cache.get(b"b") == 2
+
+    def test_zero_size_disables_cache(self):
+        """Test max_size=0 stores nothing."""
+        cache = QueryCache(max_size=0, ttl_seconds=60)
+        cache.put(b"a", "u", 1)
+        assert cache.get(b"a") is None
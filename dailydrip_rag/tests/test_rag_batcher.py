@@ -0,0 +1,131 @@
+"""Unit tests for request micro-batching."""
+import asyncio
+from unittest.mock import patch
+
+from src.rag_batcher import RagBatcher
+
+
+def test_concurrent_requests_share_one_batch_per_group():
+    """Requests in the same window and group are answered by one call, in order."""
+    calls = []
+
+    def run_batch(group, items):
+        calls.append((group, list(items)))
+        return [f"{group}:{item}" for item in items]
+
+    batcher = RagBatcher(run_batch, window_seconds=0.01, max_batch=8)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit("u1", "a"),
+            batcher.submit("u1", "b"),
+            batcher.submit("u2", "c"),
+        )
+
+    assert asyncio.run(main()) == ["u1:a", "u1:b", "u2:c"]
+    assert sorted(calls) == [("u1", ["a", "b"]), ("u2", ["c"])]
+
+
+def test_full_batch_flushes_before_window():
+    """A group reaching max_batch is sent without waiting for the window."""
+    sizes = []
+
+    def run_batch(group, items):
+        sizes.append(len(items))
+        return items
+
+    batcher = RagBatcher(run_batch, window_seconds=10.0, max_batch=2)
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.submit("u", 1), batcher.submit("u", 2)), timeout=1.0
+        )
+
+    assert asyncio.run(main()) == [1, 2]
+    assert sizes == [2]
+
+
+def test_errors_reach_every_waiter():
+    """An exception from the batch call is raised to each request in it."""
+    def run_batch(group, items):
+        raise RuntimeError("chroma unavailable")
+
+    batcher = RagBatcher(run_batch, window_seconds=0.001)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit("u", 1), batcher.submit("u", 2), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_run_query_batch_slices_each_query_to_its_fetch_size():
+    """One Chroma call serves every query, each trimmed to its own n_fetch."""
+    from src import service
+    from src.service import RagQueryParams, _run_query_batch
+
+    class Collection:
+        def __init__(self):
+            self.calls = []
+
+        def query(self, **kwargs):
+            self.calls.append(kwargs)
+            n = kwargs["n_results"]
+            rows = len(kwargs["query_embeddings"])
+            return {
+                "ids": [[f"q{r}-{i}" for i in range(n)] for r in range(rows)],
+                "documents": [[f"doc{i}" for i in range(n)] for r in range(rows)],
+                "metadatas": [[{} for _ in range(n)] for r in range(rows)],
+                "distances": [[0.1 * i for i in range(n)] for r in range(rows)],
+            }
+
+    collection = Collection()
+    requests = [
+        RagQueryParams("first", 2, False, 0.7, 3),
+        RagQueryParams("second", 1, True, 1.0, 4),
+    ]
+    embed = lambda texts: [[float(len(t))] for t in texts]
+    with patch.object(service, "_get_embedding_function", return_value=embed):
+        first, second = _run_query_batch(collection, "user-1", requests)
+
+    assert len(collection.calls) == 1
+    assert collection.calls[0]["query_embeddings"] == [[5.0], [6.0]]
+    assert collection.calls[0]["n_results"] == 4
+    assert [r["id"] for r in first] == ["q0-0", "q0-1"]
+    assert [r["id"] for r in second] == ["q1-0"]
+
+
+def test_answer_batch_embeds_once_and_queries_per_user():
+    """Requests from several users share one encoder call and keep their order."""
+    from src import service
+    from src.service import RagQueryParams, _answer_batch
+
+    encoded = []
+
+    def embed(texts):
+        encoded.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    def run_query_batch(coll, user_id, requests, embeddings=None):
+        assert coll is collection
+        return [[(user_id, r.query_text, e)] for r, e in zip(requests, embeddings)]
+
+    collection = object()
+    items = [
+        (collection, "alice", RagQueryParams("a", 1, False, 0.7, 3)),
+        (collection, "bob", RagQueryParams("bb", 1, False, 0.7, 3)),
+        (collection, "alice", RagQueryParams("ccc", 1, False, 0.7, 3)),
+    ]
+    with patch.object(service, "_get_embedding_function", return_value=embed), \
+            patch.object(service, "_run_query_batch", side_effect=run_query_batch) as query_batch:
+        results = _answer_batch(id(collection), items)
+
+    assert encoded == [["a", "bb", "ccc"]]
+    assert query_batch.call_count == 2
+    assert results == [
+        [("alice", "a", [1.0])],
+        [("bob", "bb", [2.0])],
+        [("alice", "ccc", [3.0])],
+    ]
@@ -100,3 +100,157 @@ class TestRagService:
         response = client.post("/rag", json=payload)
         # Should handle gracefully or return error
         assert response.status_code in [200, 400, 422]
+
+    def test_repeated_query_is_cached_until_feedback(self, client):
+        """Test identical queries hit the cache and feedback invalidates them."""
+        payload = {"user_id": "cache-user", "query": "washed kenya", "k": 2}
+        first = client.post("/rag", json=payload)
+        second = client.post("/rag", json=payload)
+        assert first.json() == second.json()
+        assert client.get("/cache_stats").json()["hits"] == 1
+
+        feedback = {"user_id": "cache-user", "id": "rec-1", "text": "bean.name: Kenya", "meta": {}}
+        assert client.post("/feedback", json=feedback).status_code == 201
+        assert client.get("/cache_stats").json()["size"] == 0
+
+    def test_cache_clear_drops_all_results(self, client):
+        """Test the admin endpoint empties the result cache."""
+        client.post("/rag", json={"user_id": "clear-user", "query": "natural ethiopia", "k": 2})
+        assert client.post("/cache_clear").json() == {"cleared": 1}
+        assert client.get("/cache_stats").json()["size"] == 0
+
+    def test_smaller_k_is_served_from_cached_prefix(self, client):
+        """Test a non-reranked query with a smaller k reuses the cached results."""
+        payload = {"user_id": "prefix-user", "query": "Washed Kenya", "k": 2, "use_evaluation_reranking": False}
+        first = client.post("/rag", json=payload)
+        assert first.headers["X-Cache"] == "miss"
+
+        smaller = client.post("/rag", json={**payload, "query": "washed  kenya", "k": 1})
+        assert smaller.headers["X-Cache"] == "hit"
+        assert smaller.json()["results"] == first.json()["results"][:1]
+
+        reranked = client.post("/rag", json={**payload, "k": 1, "use_evaluation_reranking": True})
+        assert reranked.headers["X-Cache"] == "miss"
+
+
+def test_warm_up_skips_search_on_empty_collection():
+    """Test startup warm-up embeds once and only searches a populated collection."""
+    from src import service
+
+    embed = MagicMock()
+    collection = MagicMock()
+    collection.count.return_value = 0
+    with patch.object(service, "_get_embedding_function", return_value=embed):
+        service._warm_up(collection)
+        collection.query.assert_not_called()
+
+        collection.count.return_value = 5
+        service._warm_up(collection)
+    assert embed.call_count == 2
+    collection.query.assert_called_once_with(query_texts=["warmup"], n_results=1, where={"access": "public"})
+
+
+def test_embed_queries_encodes_each_canonical_text_once():
+    """Test case and spacing variants share one cached embedding."""
+    from src import service
+
+    embed = MagicMock(side_effect=lambda texts: [[float(len(t))] for t in texts])
+    with patch.object(service, "_get_embedding_function", return_value=embed):
+        first = service._embed_queries(["Washed  Kenya", "washed kenya", "natural"])
+        second = service._embed_queries(["WASHED KENYA"])
+
+    embed.assert_called_once_with(["washed kenya", "natural"])
+    assert first == [[12.0], [12.0], [7.0]]
+    assert second == [[12.0]]
+
+
+class TestFeedbackOverwritesIngested:
+    """Test /feedback replaces what an ingested record returns, on a real collection."""
+
+    class ConstantEmbedding:
+        # Same vector as the conftest query embedding, so every record matches.
+        def __call__(self, input):
+            return [[0.0, 0.0, 0.0] for _ in input]
+
+        @staticmethod
+        def name():
+            return "constant"
+
+    @pytest.fixture
+    def client_and_collection(self):
+        import uuid
+
+        import chromadb
+
+        from src.service import create_app
+
+        collection = chromadb.EphemeralClient().create_collection(
+            f"feedback-{uuid.uuid4().hex}", embedding_function=self.ConstantEmbedding()
+        )
+        app = create_app()
+        app.state.collection = collection
+        yield TestClient(app), collection
+        chromadb.EphemeralClient().delete_collection(collection.name)
+
+    def test_feedback_evaluation_replaces_ingested_sections_and_score(self, client_and_collection):
+        from src.ingest import EVAL_SCORE_KEY, ingest_records
+
+        client, collection = client_and_collection
+        ingest_records([{
+            "id": "kenya",
+            "user_id": "fb-user",
+            "bean": {"name": "Kenya"},
+            "brewing": {"temperature": 92},
+            "evaluation": {"liking": 2},
+        }], collection)
+        record_id = collection.get()["ids"][0]
+
+        feedback = {
+            "user_id": "fb-user",
+            "id": record_id,
+            "text": "bean.name: Kenya",
+            "meta": {"bean.name": "Kenya", "brewing.temperature": 94, "evaluation.liking": 9},
+        }
+        assert client.post("/feedback", json=feedback).status_code == 201
+
+        response = client.post("/rag", json={"user_id": "fb-user", "query": "kenya", "k": 1})
+        result, = response.json()["results"]
+        assert result["brewing"] == {"temperature": 94}
+        assert result["evaluation"] == {"liking": 9}
+
+        stored, = collection.get(ids=[record_id])["metadatas"]
+        assert stored[EVAL_SCORE_KEY] == pytest.approx(0.9)
+
+
+class TestCollectionSearchEf:
+    """Test the service's collection gets the shared HNSW search beam."""
+
+    @pytest.fixture
+    def client(self):
+        import uuid
+
+        import chromadb
+
+        name = f"hnsw-{uuid.uuid4().hex}"
+        embedding = TestFeedbackOverwritesIngested.ConstantEmbedding()
+        with patch("src.service.DEFAULT_COLLECTION", name), \
+                patch("src.service._get_embedding_function", return_value=embedding):
+            yield chromadb.EphemeralClient(), name, embedding
+        chromadb.EphemeralClient().delete_collection(name)
+
+    def test_new_collection_is_created_with_search_ef(self, client):
+        from src.ingest import HNSW_METADATA
+        from src.service import _get_collection
+
+        chroma, _, _ = client
+        collection = _get_collection.__wrapped__(chroma)
+        assert collection.configuration["hnsw"]["ef_search"] == HNSW_METADATA["hnsw:search_ef"]
+
+    def test_existing_collection_search_ef_is_raised(self, client):
+        from src.ingest import HNSW_METADATA
+        from src.service import _get_collection
+
+        chroma, name, embedding = client
+        chroma.create_collection(name, embedding_function=embedding)
+        _get_collection.__wrapped__(chroma)
+        assert chroma.get_collection(name).configuration["hnsw"]["ef_search"] == HNSW_METADATA["hnsw:search_ef"]
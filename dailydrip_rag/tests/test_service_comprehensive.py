@@ -4,6 +4,47 @@ from unittest.mock import patch, MagicMock
 import pytest
 
 
+# Realistic query results; built once and only read by the service under test.
+QUERY_RESPONSE = {
+    'ids': [['bean1', 'bean2', 'bean3']],
+    'distances': [[0.15, 0.25, 0.35]],
+    'metadatas': [[
+        {
+            'bean.name': 'Ethiopian Yirgacheffe',
+            'bean.process': 'Washed',
+            'bean.roast_level': 'Light',
+            'brewing.brewer': 'V60',
+            'brewing.temperature': 93,
+            'brewing.dose': 15,
+            'evaluation.liking': 9.0,
+            'evaluation.jag.flavour_intensity': 5,
+            'evaluation.jag.acidity': 4,
+            'evaluation.jag.sweetness': 4
+        },
+        {
+            'bean.name': 'Colombian Supremo',
+            'bean.process': 'Natural',
+            'bean.roast_level': 'Medium',
+            'brewing.brewer': 'V60',
+            'brewing.temperature': 92,
+            'brewing.dose': 16,
+            'evaluation.liking': 8.5,
+            'evaluation.jag.flavour_intensity': 4,
+            'evaluation.jag.acidity': 3
+        },
+        {
+            'bean.name': 'Kenya AA',
+            'bean.process': 'Washed',
+            'bean.roast_level': 'Medium-Light',
+            'brewing.brewer': 'April',
+            'brewing.temperature': 94,
+            'evaluation.liking': 7.5
+        }
+    ]],
+    'documents': [['doc1', 'doc2', 'doc3']]
+}
+
+
 class TestRagServiceComprehensive:
     """Comprehensive tests for RAG service."""
     
@@ -12,46 +53,7 @@ class TestRagServiceComprehensive:
         """Mock ChromaDB client with realistic data."""
         with patch('chromadb.PersistentClient') as mock:
             mock_collection = MagicMock()
-            
-            # Mock realistic query results
-            mock_collection.query.return_value = {
-                'ids': [['bean1', 'bean2', 'bean3']],
-                'distances': [[0.15, 0.25, 0.35]],
-                'metadatas': [[
-                    {
-                        'bean.name': 'Ethiopian Yirgacheffe',
-                        'bean.process': 'Washed',
-                        'bean.roast_level': 'Light',
-                        'brewing.brewer': 'V60',
-                        'brewing.temperature': 93,
-                        'brewing.dose': 15,
-                        'evaluation.liking': 9.0,
-                        'evaluation.jag.flavour_intensity': 5,
-                        'evaluation.jag.acidity': 4,
-                        'evaluation.jag.sweetness': 4
-                    },
-                    {
-                        'bean.name': 'Colombian Supremo',
-                        'bean.process': 'Natural',
-                        'bean.roast_level': 'Medium',
-                        'brewing.brewer': 'V60',
-                        'brewing.temperature': 92,
-                        'brewing.dose': 16,
-                        'evaluation.liking': 8.5,
-                        'evaluation.jag.flavour_intensity': 4,
-                        'evaluation.jag.acidity': 3
-                    },
-                    {
-                        'bean.name': 'Kenya AA',
-                        'bean.process': 'Washed',
-                        'bean.roast_level': 'Medium-Light',
-                        'brewing.brewer': 'April',
-                        'brewing.temperature': 94,
-                        'evaluation.liking': 7.5
-                    }
-                ]],
-                'documents': [['doc1', 'doc2', 'doc3']]
-            }
+            mock_collection.query.return_value = QUERY_RESPONSE
             mock.return_value.get_or_create_collection.return_value = mock_collection
             yield mock
     
@@ -3,6 +3,8 @@ A Pulumi project to deploy a GKE cluster and the 'the-daily-drip' application.
 This is a DEMONSTRATION file showing how infrastructure code looks.
 """
 
+import string
+
 import pulumi
 from pulumi_gcp import container
 from pulumi_kubernetes import Provider, apps, core, meta
@@ -15,6 +17,8 @@ region = "us-central1"
 zone = "us-central1-a"
 app_name = "daily-drip"
 repo_name = "the-daily-drip-app"
+# Plain string rather than ns.metadata.name, so dependents don't await the Output.
+ns_name = "daily-drip-ns"
 
 # --- 1. Infrastructure: GKE Cluster ---
 # Create a GKE cluster
@@ -44,33 +48,40 @@ pulumi.export("cluster_name", cluster.name)
 # --- 2. Kubernetes Provider Setup ---
 # We need to create a Kubernetes provider instance that uses the credentials
 # from the newly created GKE cluster.
-k8s_info = pulumi.Output.all(cluster.name, cluster.endpoint, cluster.master_auth)
-k8s_config = k8s_info.apply(
-    lambda info: """apiVersion: v1
+
+# Kubeconfig template, built once at import; the apply below only substitutes the cluster fields.
+_KUBECONFIG_TMPL = string.Template("""apiVersion: v1
 clusters:
 - cluster:
-    certificate-authority-data: {0}
-    server: https://{1}
-  name: {2}
+    certificate-authority-data: $ca
+    server: https://$endpoint
+  name: $name
 contexts:
 - context:
-    cluster: {2}
-    user: {2}
-  name: {2}
-current-context: {2}
+    cluster: $name
+    user: $name
+  name: $name
+current-context: $name
 kind: Config
-preferences: {{}}
+preferences: {}
 users:
-- name: {2}
+- name: $name
   user:
     auth-provider:
       config:
         cmd-args: config config-helper --format=json
         cmd-path: gcloud
-        expiry-key: '{{.credential.token_expiry}}'
-        token-key: '{{.credential.access_token}}'
+        expiry-key: '{.credential.token_expiry}'
+        token-key: '{.credential.access_token}'
       name: gcp
-""".format(info[2]['cluster_ca_certificate'], info[1], info[0]))
+""")
+
+k8s_info = pulumi.Output.all(cluster.name, cluster.endpoint, cluster.master_auth)
+k8s_config = k8s_info.apply(
+    lambda info: _KUBECONFIG_TMPL.substitute(
+        ca=info[2]['cluster_ca_certificate'], endpoint=info[1], name=info[0]
+    )
+)
 
 # Create the Provider
 k8s_provider = Provider("gke_drip_provider", kubeconfig=k8s_config)
@@ -85,7 +96,7 @@ full_image_name = f"gcr.io/{project}/{repo_name}:{image_tag}"
 
 # Create the Namespace (Optional, but good practice)
 ns = core.v1.Namespace("app-ns",
-    metadata=meta.v1.ObjectMetaArgs(name="daily-drip-ns"),
+    metadata=meta.v1.ObjectMetaArgs(name=ns_name),
     opts=pulumi.ResourceOptions(provider=k8s_provider)
 )
 
@@ -94,7 +105,7 @@ app_labels = {"app": app_name}
 deployment = apps.v1.Deployment("app-deployment",
     metadata=meta.v1.ObjectMetaArgs(
         name="daily-drip-deployment",
-        namespace=ns.metadata.name,
+        namespace=ns_name,
     ),
     spec=apps.v1.DeploymentSpecArgs(
         replicas=1,
@@ -128,14 +139,14 @@ deployment = apps.v1.Deployment("app-deployment",
             ),
         ),
     ),
-    opts=pulumi.ResourceOptions(provider=k8s_provider)
+    opts=pulumi.ResourceOptions(provider=k8s_provider, depends_on=[ns])
 )
 
 # Service
 service = core.v1.Service("app-service",
     metadata=meta.v1.ObjectMetaArgs(
         name="daily-drip-service",
-        namespace=ns.metadata.name,
+        namespace=ns_name,
     ),
     spec=core.v1.ServiceSpecArgs(
         selector=app_labels,
@@ -146,7 +157,7 @@ service = core.v1.Service("app-service",
         )],
         type="LoadBalancer"
     ),
-    opts=pulumi.ResourceOptions(provider=k8s_provider)
+    opts=pulumi.ResourceOptions(provider=k8s_provider, depends_on=[ns])
 )
 
 # Export the Service External IP
@@ -1,36 +1,111 @@
+import argparse
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional, Sequence
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore[assignment]
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 TOOLS_DIR = REPO_ROOT / "tools"
 
 
-def main() -> None:
-    """Send a visualize request and save the HTML output to out.html."""
-    req_path = TOOLS_DIR / "visualize_request.json"
-    if not req_path.exists():
-        raise FileNotFoundError(f"{req_path.name} not found in repository root.")
+def make_session() -> requests.Session:
+    """Build a pooled session that retries transient gateway errors."""
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503, 504],
+        # Rendering has no side effects, so the POST is safe to retry.
+        allowed_methods=frozenset({"POST"}),
+    )
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retries))
+    return session
+
+
+_SESSION = make_session()
 
-    payload = json.loads(req_path.read_text(encoding="utf-8"))
 
-    response = requests.post(
+def save(req_path: Path, output_path: Path, session: Optional[requests.Session] = None) -> Path:
+    """Send one visualize request and save its HTML output."""
+    session = session or _SESSION
+    # The request file already is the JSON body: post its bytes as-is, with no
+    # parse/re-serialize round trip. Malformed files surface as the server's 4xx.
+    response = session.post(
         "http://localhost:9000/visualize",
-        json=payload,
+        data=req_path.read_bytes(),
+        headers=_JSON_HEADERS,
         timeout=60,
     )
     response.raise_for_status()
 
-    data = response.json()
+    # Parse the raw body directly (orjson when installed) and write bytes, skipping
+    # requests' charset sniffing and text-mode newline translation.
+    data = _json_loads(response.content)
     html = data.get("outputs", {}).get("html")
     if not html:
-        raise ValueError("HTML output missing in response.")
+        raise ValueError(f"HTML output missing in response to {req_path.name}.")
+
+    output_path.write_bytes(html.encode("utf-8"))
+    return output_path
+
+
+def _output_name(req_path: Path) -> str:
+    stem = req_path.stem
+    if stem.startswith("visualize_request"):
+        return f"out{stem[len('visualize_request'):]}.html"
+    return f"out_{stem}.html"
+
+
+def main(
+    req_paths: Optional[Sequence[Path]] = None,
+    out_dir: Path = REPO_ROOT,
+    session: Optional[requests.Session] = None,
+    concurrency: int = 4,
+) -> None:
+    """
+    Send each visualize request and save its HTML output into ``out_dir``:
+    visualize_request.json -> out.html, visualize_request_<name>.json -> out_<name>.html,
+    any other <name>.json -> out_<name>.html.
+    Defaults to every tools/visualize_request*.json.
+
+    Requests run concurrently (bounded by ``concurrency``, the session's pool size)
+    so server-side rendering overlaps instead of running back to back.
+    """
+    session = session or _SESSION
+    if not req_paths:
+        req_paths = sorted(TOOLS_DIR.glob("visualize_request*.json"))
+        if not req_paths:
+            raise FileNotFoundError(f"No visualize_request*.json found in {TOOLS_DIR}.")
 
-    output_path = REPO_ROOT / "out.html"
-    output_path.write_text(html, encoding="utf-8")
-    print(f"Saved visualization to {output_path}")
+    jobs = [(req_path, out_dir / _output_name(req_path)) for req_path in map(Path, req_paths)]
+    outputs = [output_path for _, output_path in jobs]
+    duplicates = sorted({str(p) for p in outputs if outputs.count(p) > 1})
+    if duplicates:
+        # Concurrent writers to one file would silently drop all but the last render.
+        raise ValueError(f"Several requests would write the same output: {', '.join(duplicates)}")
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(jobs))) as pool:
+        futures = [pool.submit(save, req_path, output_path, session) for req_path, output_path in jobs]
+        for future in futures:
+            print(f"Saved visualization to {future.result()}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Render visualize requests to HTML.")
+    parser.add_argument("requests", nargs="*", type=Path, help="Request JSON files (default: tools/visualize_request*.json).")
+    parser.add_argument("--out-dir", type=Path, default=REPO_ROOT, help="Directory for the HTML outputs.")
+    args = parser.parse_args()
+    main(args.requests, args.out_dir)